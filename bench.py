@@ -0,0 +1,78 @@
+import argparse
+import time
+
+from nespy.bus import Bus
+from nespy.cartridge import Cartridge
+from nespy.recompiler import Recompiler
+from nespy.const import *
+
+def bench_frames(nes: Bus, frames: int):
+    reused = 0
+    drawn = 0
+
+    start = time.perf_counter()
+
+    for i in range(frames):
+        nes.run_frame()
+        reused += nes.ppu.reuse_counts[0]
+        drawn += sum(nes.ppu.reuse_counts)
+
+    elapsed = time.perf_counter() - start
+
+    print(f"{frames} frames in {elapsed:.3f}s, {frames / elapsed:.2f} FPS")
+
+    if drawn:
+        print(f"{reused} of {drawn} scanlines reused from the frame before, {reused / drawn:.1%}")
+
+    if nes.skipped_cycles:
+        print(f"{nes.skipped_cycles} of {nes.cpu.clock_count} cpu cycles skipped in idle loops")
+
+def bench_cpu(nes: Bus, seconds: int):
+    # run the cpu on its own, the ppu is never clocked so this only measures instruction dispatch
+    cpu = nes.cpu
+    target = CPU_CLOCK_FREQ * seconds
+    instructions = 0
+
+    start = time.perf_counter()
+
+    while cpu.clock_count < target:
+        cpu.step()
+        instructions += 1
+
+    elapsed = time.perf_counter() - start
+
+    print(f"{instructions} instructions in {elapsed:.3f}s, {instructions / elapsed / 1000:.1f}k instructions/s, {target / elapsed / CPU_CLOCK_FREQ:.3f}x realtime")
+
+def main():
+    parser = argparse.ArgumentParser(description="time how fast nespy runs a rom")
+    parser.add_argument("rom")
+    parser.add_argument("--frames", type=int, default=60, help="frames to run")
+    parser.add_argument("--engine", choices=("dot", "catchup"), default="catchup")
+    parser.add_argument("--fused", action="store_true", help="dispatch through the generated per-opcode handlers")
+    parser.add_argument("--recompile", action="store_true", help="run PRG ROM through compiled basic blocks")
+    parser.add_argument("--per-dot-ppu", action="store_true", help="never let the catch-up engine render whole scanlines")
+    parser.add_argument("--no-idle-skip", action="store_true", help="run idle loops instruction by instruction")
+    parser.add_argument("--no-reuse", action="store_true", help="draw every scanline even when it hasn't changed")
+    parser.add_argument("--frameskip", type=int, default=1, metavar="N", help="only draw every Nth frame")
+    parser.add_argument("--cpu-only", type=int, default=0, metavar="SECONDS", help="only run the cpu for this many emulated seconds")
+    args = parser.parse_args()
+
+    nes = Bus(ENGINE_CATCHUP if args.engine == "catchup" else ENGINE_DOT)
+    nes.cpu.fused = args.fused
+    nes.cpu.recompiler = Recompiler(nes) if args.recompile else None
+    nes.idle_skip = not args.no_idle_skip
+    nes.ppu.render_scanlines = not args.per_dot_ppu
+    nes.frameskip = args.frameskip
+    nes.ppu.reuse_lines = not args.no_reuse
+    nes.plug_cartridge(Cartridge(args.rom))
+    nes.reset()
+
+    if args.cpu_only:
+        nes.engine = ENGINE_DOT # nothing to catch up, register accesses go straight through
+        nes.event_clock_count = 0xFFFFFFFFFFFFFFFF # and no event for compiled blocks to stop short of
+        bench_cpu(nes, args.cpu_only)
+    else:
+        bench_frames(nes, args.frames)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import argparse
+
+from nespy.bus import Bus
+from nespy.cartridge import Cartridge
+from nespy.const import *
+
+def cpu_state(nes: Bus) -> tuple:
+    cpu = nes.cpu
+    return (cpu.pc, cpu.a, cpu.x, cpu.y, cpu.s, cpu.get_status(), cpu.cycles, cpu.clock_count)
+
+def lockstep(rom: str, frames: int) -> bool:
+    # clock the per-dot engine with the lookup table and with the fused handlers side by side,
+    # they have to agree on every cycle, OAM DMA stalls included
+    plain = Bus(ENGINE_DOT)
+    fused = Bus(ENGINE_DOT)
+    fused.cpu.fused = True
+
+    for nes in (plain, fused):
+        nes.plug_cartridge(Cartridge(rom))
+        nes.reset()
+
+    stalls = 0
+
+    while plain.frame_count < frames:
+        plain.clock()
+        fused.clock()
+
+        if cpu_state(plain) != cpu_state(fused):
+            print(f"diverged on system clock {plain.system_clock_count}: {cpu_state(plain)} vs {cpu_state(fused)}")
+            return False
+
+        if plain.cpu.cycles >= 512 and plain.cpu.instruction_clock == plain.cpu.clock_count - 1: # a DMA just started
+            stalls += 1
+
+    print(f"{frames} frames in lockstep, {stalls} instructions stalled")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="check the fused handlers against the lookup table on the per-dot engine")
+    parser.add_argument("rom")
+    parser.add_argument("--frames", type=int, default=4, help="frames to run")
+    args = parser.parse_args()
+
+    if not lockstep(args.rom, args.frames):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
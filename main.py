@@ -1,21 +1,27 @@
 import cProfile
 
 import pygame as pg
-import numpy as np
 
 from nespy.bus import Bus
 from nespy.cartridge import Cartridge
+from nespy.audio import AudioRing, PygameAudioOutput, AUDIO_TARGET_LEVEL
 from nespy.operations import OPCODE_LOOKUP
+from nespy.const import *
 
 pg.display.set_caption("NESPY")
 pg.display.set_icon(pg.Surface((16,16)))
 
 def main():
-    nes = Bus()
+    nes = Bus(ENGINE_CATCHUP)
     cart = Cartridge("./roms/zelda.nes")
     nes.plug_cartridge(cart)
     nes.reset()
 
+    pg.mixer.init(frequency=AUDIO_SAMPLE_RATE, size=-16, channels=1)
+    nes.audio = AudioRing()
+    audio = PygameAudioOutput(nes.audio)
+    audio.start()
+
     clock = pg.time.Clock()
 
     import time
@@ -28,29 +34,28 @@ def main():
     display = pg.display.set_mode((256*4, 240*4), pg.HWSURFACE|pg.HWACCEL|pg.DOUBLEBUF)
 
     while True:
-        nes.clock()
-
-        if nes.ppu.frame_complete:
-            for event in pg.event.get():
-                if event.type == pg.QUIT:
-                    exit()
+        nes.run_frame()
 
-            keys = pg.key.get_pressed()
-            
-            nes.controllers = (
-                keys[pg.K_RIGHT] | (keys[pg.K_LEFT] << 1) | (keys[pg.K_DOWN] << 2) | (keys[pg.K_UP] << 3) | (keys[pg.K_s] << 4) | (keys[pg.K_a] << 5) | (keys[pg.K_x] << 6) | (keys[pg.K_z] << 7),
-                0x00
-            )
+        for event in pg.event.get():
+            if event.type == pg.QUIT:
+                exit()
 
-            pg.surfarray.blit_array(screen, np.array(nes.ppu.spr_screen))
-            pg.transform.scale_by(screen, 4, display)
-            pg.display.flip()
+        keys = pg.key.get_pressed()
+        
+        nes.controllers = (
+            keys[pg.K_RIGHT] | (keys[pg.K_LEFT] << 1) | (keys[pg.K_DOWN] << 2) | (keys[pg.K_UP] << 3) | (keys[pg.K_s] << 4) | (keys[pg.K_a] << 5) | (keys[pg.K_x] << 6) | (keys[pg.K_z] << 7),
+            0x00
+        )
 
-            clock.tick(60)
+        pg.surfarray.blit_array(screen, nes.ppu.frame.T) # surfarrays are indexed x first
+        pg.transform.scale_by(screen, 4, display)
+        pg.display.flip()
 
-            print(int(clock.get_fps()), "FPS")
+        # the sound card sets the pace, wait for it to get through what is buffered
+        nes.audio.wait(AUDIO_TARGET_LEVEL)
+        clock.tick()
 
-            nes.ppu.frame_complete = False
+        print(int(clock.get_fps()), "FPS")
 
 if __name__ == "__main__":
     #main()
@@ -0,0 +1,170 @@
+import threading
+import time
+import wave
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from nespy.const import *
+
+# Audio output
+
+# the apu hands over a frame's worth of samples at a time, they go into a ring buffer that an output thread drains
+# at whatever pace the sound card or file wants them
+# the emulator waits on the buffer instead of a frame timer, and nudges the apu's output rate up or down a little
+# so the buffer hovers around AUDIO_TARGET_LEVEL instead of slowly running dry or over
+
+AUDIO_BUFFER_SIZE = AUDIO_SAMPLE_RATE # samples the ring can hold
+AUDIO_TARGET_LEVEL = AUDIO_BLOCK_SIZE # samples the producer tries to keep buffered
+AUDIO_MAX_RATE_ADJUST = 0.005 # furthest the output rate is pulled away from AUDIO_SAMPLE_RATE
+
+class AudioRing():
+    # one thread writes and one thread reads, each only ever moves its own position forward
+    # and only after the samples are in place, so neither needs a lock
+    buffer: np.ndarray = None
+
+    write_pos: int = 0 # samples written since the start, only moved by the producer
+    read_pos: int = 0 # samples read since the start, only moved by the consumer
+
+    last_sample: float = 0.0 # held through underruns so they don't click
+    underruns: int = 0 # reads that came up short, for debugging
+
+    def __init__(self, size: int = AUDIO_BUFFER_SIZE):
+        self.buffer = np.zeros(size, dtype=np.float32)
+
+    def level(self) -> int:
+        return self.write_pos - self.read_pos
+
+    def write(self, samples: np.ndarray) -> int:
+        """
+        Add samples to the ring, whatever doesn't fit is dropped, returns how many made it
+        """
+        size = len(self.buffer)
+        count = min(len(samples), size - self.level())
+        start = self.write_pos % size
+        first = min(count, size - start)
+
+        self.buffer[start:start + first] = samples[:first]
+        self.buffer[:count - first] = samples[first:count]
+        self.write_pos += count
+
+        return count
+
+    def read(self, count: int) -> np.ndarray:
+        """
+        Take the next count samples, padded with the last one if the ring runs dry
+        """
+        size = len(self.buffer)
+        available = min(count, self.level())
+        start = self.read_pos % size
+        first = min(available, size - start)
+
+        samples = np.empty(count, dtype=np.float32)
+        samples[:first] = self.buffer[start:start + first]
+        samples[first:available] = self.buffer[:available - first]
+        self.read_pos += available
+
+        if available:
+            self.last_sample = samples[available - 1]
+
+        if available < count:
+            samples[available:] = self.last_sample
+            self.underruns += 1
+
+        return samples
+
+    def rate_adjustment(self) -> float:
+        """
+        Factor for the cpu cycles per output sample, above 1 when too much is buffered so fewer samples get made
+        """
+        error = (self.level() - AUDIO_TARGET_LEVEL) / AUDIO_TARGET_LEVEL
+
+        return 1.0 + AUDIO_MAX_RATE_ADJUST * min(max(error, -1.0), 1.0)
+
+    def wait(self, level: int):
+        # hold the producer back until no more than level samples are buffered
+        while self.level() > level:
+            time.sleep(0.001)
+
+class AudioOutput(ABC):
+    ring: AudioRing = None
+    thread: threading.Thread = None
+    stopped: threading.Event = None
+
+    def __init__(self, ring: AudioRing):
+        self.ring = ring
+        self.stopped = threading.Event()
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.drain()
+
+        self.close()
+
+    @abstractmethod
+    def drain(self):
+        # move whatever the ring has ready to the output, called over and over from the thread
+        pass
+
+    def close(self):
+        pass
+
+class PygameAudioOutput(AudioOutput):
+    # keeps a block queued up behind the one the mixer is playing, pygame.mixer has to be initialized already
+    channel = None # pygame.mixer.Channel
+    channels: int = 1 # output channels the mixer was opened with
+
+    def __init__(self, ring: AudioRing):
+        import pygame as pg
+
+        super().__init__(ring)
+        self.channel = pg.mixer.Channel(0)
+        self.channels = pg.mixer.get_init()[2]
+
+    def drain(self):
+        import pygame as pg
+
+        if self.channel.get_queue() is None:
+            samples = (self.ring.read(AUDIO_BLOCK_SIZE) * 0x7FFF).astype(np.int16)
+
+            if self.channels > 1:
+                samples = np.repeat(samples[:, None], self.channels, axis=1)
+
+            self.channel.queue(pg.sndarray.make_sound(samples))
+
+        self.stopped.wait(AUDIO_BLOCK_SIZE / AUDIO_SAMPLE_RATE / 4)
+
+    def close(self):
+        self.channel.stop()
+
+class WavAudioOutput(AudioOutput):
+    # writes everything that comes in to a 16 bit mono wav file
+    file: wave.Wave_write = None
+
+    def __init__(self, ring: AudioRing, path: str):
+        super().__init__(ring)
+        self.file = wave.open(path, "wb")
+        self.file.setnchannels(1)
+        self.file.setsampwidth(2)
+        self.file.setframerate(AUDIO_SAMPLE_RATE)
+
+    def drain(self):
+        self.write(self.ring.level())
+        self.stopped.wait(AUDIO_BLOCK_SIZE / AUDIO_SAMPLE_RATE)
+
+    def write(self, count: int):
+        if count:
+            self.file.writeframes((self.ring.read(count) * 0x7FFF).astype("<i2").tobytes())
+
+    def close(self):
+        self.write(self.ring.level())
+        self.file.close()
@@ -0,0 +1,83 @@
+import numpy as np
+
+# Band-limited synthesis
+
+# a channel's output only ever jumps between levels, so instead of point sampling it (which aliases) every jump is
+# recorded as a delta at the exact cpu cycle it happens on, spread over the neighbouring output samples through
+# a band-limited impulse and summed back up into levels when the samples are read
+# the cost goes with how often a channel changes level, not with the sample rate
+
+BLIP_PHASES = 32 # fractional sample positions the kernel is precomputed for
+BLIP_WIDTH = 16 # output samples a single delta is spread over
+BLIP_CUTOFF = 0.9 # of the nyquist frequency, leaves the kernel room to roll off
+
+def blip_kernel() -> np.ndarray:
+    # blackman windowed sinc for every phase, centered BLIP_WIDTH / 2 samples after the delta
+    # each row sums to 1 so a step always ends up exactly as tall as its delta
+    half = BLIP_WIDTH // 2
+    offsets = np.arange(BLIP_WIDTH) - half - (np.arange(BLIP_PHASES) / BLIP_PHASES)[:, None]
+
+    window = 0.42 + 0.5 * np.cos(np.pi * offsets / half) + 0.08 * np.cos(2 * np.pi * offsets / half)
+    kernel = np.sinc(BLIP_CUTOFF * offsets) * np.where(np.abs(offsets) < half, window, 0)
+
+    return kernel / kernel.sum(axis=1, keepdims=True)
+
+BLIP_KERNEL = blip_kernel()
+
+class BlipBuffer():
+    cycles_per_sample: float = 0.0
+
+    deltas: np.ndarray = None # level changes spread over the samples that haven't been read yet
+    start_clock: float = 0.0 # cpu cycle deltas[0] falls on
+    level: float = 0.0 # level at start_clock, what the next read sums up from
+
+    def __init__(self, cycles_per_sample: float):
+        self.cycles_per_sample = cycles_per_sample
+        self.reset()
+
+    def reset(self):
+        self.deltas = np.zeros(4096)
+        self.start_clock = 0.0
+        self.level = 0.0
+
+    def add_deltas(self, times: np.ndarray, deltas: np.ndarray):
+        """
+        Add a level change of deltas[i] on cpu cycle times[i], none of them before the last read
+        """
+        positions = (times - self.start_clock) / self.cycles_per_sample
+        samples = positions.astype(np.int64)
+        phases = ((positions - samples) * BLIP_PHASES).astype(np.int64)
+
+        indices = (samples[:, None] + np.arange(BLIP_WIDTH)).ravel()
+        weights = (BLIP_KERNEL[phases] * deltas[:, None]).ravel()
+
+        size = indices.max() + 1 if len(indices) else 0
+
+        self.reserve(size)
+        self.deltas[:size] += np.bincount(indices, weights, size)
+
+    def reserve(self, size: int):
+        if size > len(self.deltas):
+            self.deltas = np.concatenate((self.deltas, np.zeros(max(size, 2 * len(self.deltas)) - len(self.deltas))))
+
+    def read(self, clock: int) -> np.ndarray:
+        """
+        Take the levels of every sample before cpu cycle clock, they can't change anymore
+        """
+        count = int((clock - self.start_clock) / self.cycles_per_sample)
+
+        if count <= 0:
+            return np.zeros(0)
+
+        self.reserve(count)
+
+        samples = self.level + np.cumsum(self.deltas[:count])
+        self.level = samples[-1]
+
+        # move the tails of the kernels hanging over into the next read up front
+        remaining = len(self.deltas) - count
+        self.deltas[:remaining] = self.deltas[count:]
+        self.deltas[remaining:] = 0
+        self.start_clock += count * self.cycles_per_sample
+
+        return samples
@@ -2,82 +2,180 @@ from nespy.cmp_2A03 import Cmp2A03
 from nespy.cmp_2C02 import Cmp2C02
 from nespy.cmp_6502 import Cmp6502
 from nespy.cartridge import Cartridge
+from nespy.audio import AudioRing
+from nespy.idle_loop import loop_cycles
+from nespy.scheduler import Scheduler
 from nespy.const import *
 
 class Bus():
     cpu: Cmp6502 = None
     ppu: Cmp2C02 = None
     apu: Cmp2A03 = None
-    ram: list = None
+    ram: bytearray = None
     cartridge: Cartridge = None
 
+    engine: int = ENGINE_DOT
+
     system_clock_count: int = 0
+    scheduler: Scheduler = None # what the per-dot engine has to do other than clocking the ppu, and when
+    event_clock_count: int = 0 # system clock the catch-up engine has to reach before the ppu could raise anything
 
-    dma_page: int = 0x00
-    dma_addr: int = 0x00
-    dma_value: int = 0x00 
-    dma_enable: bool = False # are we currently running a DMA
-    dma_wait: bool = True # set this to make sure the DMA only starts on an even cycle
+    # fast forward through loops that just wait for the ppu, only done by the catch-up engine
+    idle_skip: bool = True
+    idle_head: int = -1 # pc the last backwards jump landed on
+    idle_tail: int = -1 # pc the step that jumped back started at
+    idle_cycles: int = 0 # cycles per iteration if that loop is idle, 0 if it isn't
+    idle_polls: bool = False # the loop reads PPUSTATUS, so sprite zero hit and overflow count as events too
+    idle_clock: int = 0 # cpu clock count when the loop last came around
+    idle_state: tuple = None # cpu registers when the loop last came around
+    skipped_cycles: int = 0 # cpu cycles skipped in idle loops since reset
+    budget_clock_count: int = 0xFFFFFFFFFFFFFFFF # system clock run_cycles stops at, idle loops aren't skipped past it
 
     open_bus: int = 0x00
 
+    # only one frame out of every frameskip is drawn, the others still run the ppu with the exact same timing
+    frameskip: int = 1
+    frame_count: int = 0 # frames finished since reset
+
+    # the cpu address space split into 256 pages, a page is either plain memory read or written as
+    # memory[offset + (addr & 0xFF)] or, when memory is None, goes through the handler for that page
+    read_pages: list = None # (memory, offset) per page
+    write_pages: list = None # (memory, offset) per page
+    read_handlers: list = None
+    write_handlers: list = None
+    bank_epoch: int = -1 # mapper bank epoch the cartridge pages were mapped for
+
     controller_states: list = None
     controllers: tuple = None
 
-    audio_sample: float = 0
-    audio_time: float = 0
-    audio_global_time: float = 0
-    audio_time_per_clock: float = 1 / PPU_CLOCK_FREQ
-    audio_system_per_system_sample: float = 1/AUDIO_SAMPLE_RATE
-    audio_sample: int = 0x00
+    audio: AudioRing = None # gets every frame's samples when set, they are thrown away otherwise
 
-    def __init__(self):
+    def __init__(self, engine: int = ENGINE_DOT):
+        self.engine = engine
         self.cpu = Cmp6502(self)
         self.ppu = Cmp2C02(self)
         self.apu = Cmp2A03()
-        self.ram = [0x00 for i in range(0x0800)]
+        self.scheduler = Scheduler()
+        self.ram = bytearray(0x0800)
         self.controllers = (0x00, 0x00)
         self.controller_state = [0x00, 0x00]
-        self.audio_samples = []
+        self.map_memory()
     
     def reset(self):
         if self.cartridge:
             self.cartridge.reset()
         
+        self.ram = bytearray(0x0800)
+        self.map_memory()
+
         self.cpu.reset()
         self.ppu.reset()
-        self.ram = [0x00 for i in range(0x0800)]
+        self.apu.reset()
 
         self.system_clock_count = 0
+        self.event_clock_count = 0
+
+        self.scheduler.clear()
+        self.scheduler.repeat(0, 3, self.clock_cpu) # cpu only clocks once every 3 system clocks
+        self.scheduler.schedule(self.apu.step_clock * 3, self.step_apu)
+
+        self.idle_head = -1
+        self.idle_tail = -1
+        self.skipped_cycles = 0
+
+        self.frame_count = 0
 
-        self.dma_page = 0x00
-        self.dma_addr = 0x00
-        self.dma_value = 0x00
-        self.dma_wait = True
-        self.dma_enable = False
-    
-        self.audio_time = 0
-        self.audio_global_time = 0
-        self.audio_sample = 0x00
 
     def plug_cartridge(self, cart: Cartridge):
         self.cartridge = cart
         self.ppu.plug_cartridge(self.cartridge)
+        self.map_memory()
+
+    def map_memory(self):
+        # RAM is mirrored every 0x800 and the PPU registers every 8 bytes, both just repeat over their pages
+        self.read_pages = [(None, 0)] * 0x100
+        self.write_pages = [(None, 0)] * 0x100
+        self.read_handlers = [self.read_open_bus] * 0x100
+        self.write_handlers = [self.write_open_bus] * 0x100
+
+        for page in range(0x00, 0x20):
+            self.read_pages[page] = (self.ram, (page & 0x07) << 8)
+            self.write_pages[page] = (self.ram, (page & 0x07) << 8)
+
+        for page in range(0x20, 0x40):
+            self.read_handlers[page] = self.read_ppu
+            self.write_handlers[page] = self.write_ppu
+
+        self.read_handlers[0x40] = self.read_io
+        self.write_handlers[0x40] = self.write_io
+
+        self.bank_epoch = -1
+        self.map_cartridge()
+
+    def map_cartridge(self):
+        # point the pages above 0x4100 at wherever the mapper has its banks right now
+        if self.cartridge is None:
+            return
+
+        self.bank_epoch = self.cartridge.mapper.bank_epoch
+        self.ppu.map_nametables()
+        self.ppu.map_pattern_tables()
+
+        for page in range(0x41, 0x100):
+            page_memory = self.cartridge.cpu_page(page << 8)
+
+            if page_memory is not None:
+                self.read_pages[page] = page_memory
+
+                # PRG ROM writes go to the mapper registers, only memory the mapper owns can be written directly
+                if page_memory[0] is not self.cartridge.prg_memory:
+                    self.write_pages[page] = page_memory
+                else:
+                    self.write_pages[page] = (None, 0)
+
+            else:
+                self.read_pages[page] = (None, 0)
+                self.write_pages[page] = (None, 0)
+
+            self.read_handlers[page] = self.read_cartridge
+            self.write_handlers[page] = self.write_cartridge
 
     def read(self, addr: int, read_only: bool = False):
-        cart_read = self.cartridge.cpu_read(addr)
+        memory, offset = self.read_pages[addr >> 8]
 
-        if cart_read is not None: # Cartridge address range
-            # The cartridge can effectively trump any bus read using the mapper
-            return cart_read
+        if memory is None:
+            return self.read_handlers[addr >> 8](addr, read_only)
+
+        return memory[offset + (addr & 0xFF)]
+
+    def write(self, addr: int, value: int):
+        value &= 0xFF # bounds checking
+
+        self.open_bus = value
+
+        memory, offset = self.write_pages[addr >> 8]
+
+        if memory is None:
+            self.write_handlers[addr >> 8](addr, value)
+        else:
+            memory[offset + (addr & 0xFF)] = value
+
+    def read_open_bus(self, addr: int, read_only: bool = False):
+        return self.open_bus
+
+    def read_ppu(self, addr: int, read_only: bool = False):
+        if self.engine == ENGINE_CATCHUP:
+            self.catch_up()
+
+        return self.ppu.cpu_read(addr & 0x0007, read_only)
+
+    def read_io(self, addr: int, read_only: bool = False):
+        if addr >= 0x4020: # the cartridge picks up at the end of the page
+            return self.read_cartridge(addr, read_only)
 
-        elif 0x0000 <= addr <= 0x1FFF: # RAM address range
-            return self.ram[addr & 0x7FF] # mirrored every 0x800
-        
-        elif 0x2000 <= addr <= 0x3FFF: # PPU address range
-            return self.ppu.cpu_read(addr & 0x0007, read_only)
-        
         elif addr == 0x4015: # specific address that reads APU status
+            self.apu.run(self.cpu.clock_count) # the length counters could have run out since the last write
+
             return self.apu.cpu_read(addr)
 
         elif 0x4016 <= addr <= 0x4017: # both plugged in controllers
@@ -87,66 +185,157 @@ class Bus():
 
         return self.open_bus
 
-    def write(self, addr: int, value: int):
-        value &= 0xFF # bounds checking
+    def read_cartridge(self, addr: int, read_only: bool = False):
+        cart_read = self.cartridge.cpu_read(addr)
 
-        self.open_bus = value
+        if cart_read is not None:
+            return cart_read
 
-        if self.cartridge.cpu_write(addr, value): # cartridge mapper can trump any write
-            pass
+        return self.open_bus
 
-        elif 0x0000 <= addr <= 0x1FFF: # RAM address range
-            self.ram[addr & 0x7FF] = value # mirrored every 0x800
+    def write_open_bus(self, addr: int, value: int):
+        pass
 
-        elif 0x2000 <= addr <= 0x3FFF: # PPU address range
-            self.ppu.cpu_write(addr & 0x0007, value)
-        
-        elif (0x4000 <= addr <= 0x4013) or addr == 0x4015: # APU addresses
-            self.apu.cpu_write(addr, value)
+    def write_ppu(self, addr: int, value: int):
+        if self.engine == ENGINE_CATCHUP:
+            self.catch_up()
+
+        self.ppu.cpu_write(addr & 0x0007, value)
+
+    def write_io(self, addr: int, value: int):
+        if addr >= 0x4020: # the cartridge picks up at the end of the page
+            self.write_cartridge(addr, value)
+
+        elif (0x4000 <= addr <= 0x4013) or addr == 0x4015 or addr == 0x4017: # APU addresses
+            # only logged, the apu catches up on its own and doesn't affect the ppu
+            self.apu.write(self.cpu.clock_count, addr, value)
             
         elif addr == 0x4014: # specific address that triggers a DMA
-            self.dma_page = value
-            self.dma_addr = 0x00
-            self.dma_enable = True
+            self.oam_dma(value)
         
-        elif 0x4016 <= addr <= 0x4017: # both plugged in controllers
-            self.controller_state[addr & 0x0001] = self.controllers[addr & 0x0001]
+        elif addr == 0x4016: # strobes both plugged in controllers
+            self.controller_state[0] = self.controllers[0]
+            self.controller_state[1] = self.controllers[1]
+
+    def oam_dma(self, page: int):
+        # copy the whole page into OAM at once, starting at OAMADDR and wrapping around like 256 writes to $2004 would,
+        # then halt the cpu for the 512 cycles of copying plus the 1 or 2 it waits to start on an odd cycle,
+        # counted from the instruction's start since the engines don't agree on where inside it the write happens
+        if self.engine == ENGINE_CATCHUP:
+            self.catch_up()
+
+        first_cycle = self.cpu.instruction_clock + 1
+
+        memory, offset = self.read_pages[page]
+
+        if memory is not None:
+            source = memory[offset:offset + 0x100]
+        else:
+            source = [self.read((page << 8) | i) for i in range(0x100)]
+
+        oam = self.ppu.oam
+        start = self.ppu.oam_addr
+
+        oam[start:] = source[:0x100 - start]
+        oam[:start] = source[0x100 - start:]
+
+        self.cpu.cycles += 514 - (first_cycle & 1)
+
+    def write_cartridge(self, addr: int, value: int):
+        if self.engine == ENGINE_CATCHUP: # the write could switch the banks the ppu is drawing from
+            self.catch_up()
+
+        self.cartridge.cpu_write(addr, value)
+
+        if self.cartridge.mapper.bank_epoch != self.bank_epoch: # the write switched banks
+            self.map_cartridge()
+
+    def render_next_frame(self) -> bool:
+        # called by the ppu as it finishes a frame
+        self.apu.run(self.cpu.clock_count)
+        samples = self.apu.read_samples()
+
+        if self.audio is not None:
+            self.audio.write(samples)
+            self.apu.adjust_rate(self.audio.rate_adjustment())
+
+        self.frame_count += 1
+        return self.frame_count % self.frameskip == 0
+
+    def run_frame(self):
+        """
+        Run until the ppu finishes the frame it is on
+        """
+        self.run_cycles(-1)
+
+    def run_cycles(self, cycles: int) -> bool:
+        """
+        Run for cycles system clocks or until the ppu finishes a frame, whichever comes first, a negative budget
+        never runs out, returns whether a frame was finished
+        """
+        ppu = self.ppu
+
+        if self.engine == ENGINE_CATCHUP:
+            # the ppu trails the cpu here, the budget is counted from where the cpu is
+            cpu = self.cpu
+            step = self.step
+            end = cpu.clock_count * 3 + cycles if cycles >= 0 else 0xFFFFFFFFFFFFFFFF
+            self.budget_clock_count = end
+
+            while not ppu.frame_complete and cpu.clock_count * 3 < end:
+                step()
+
+        else:
+            # Bus.clock with everything it touches held in locals, handlers still get to see the clock
+            end = self.system_clock_count + cycles if cycles >= 0 else 0xFFFFFFFFFFFFFFFF
+            ppu_clock = ppu.clock
+            scheduler = self.scheduler
+            clock = self.system_clock_count
+
+            while not ppu.frame_complete and clock < end:
+                ppu_clock()
+
+                if clock >= scheduler.next_clock:
+                    self.system_clock_count = clock
+                    scheduler.run(clock)
+
+                clock += 1
+
+            self.system_clock_count = clock
+
+        if ppu.frame_complete:
+            ppu.frame_complete = False
+            return True
+
+        return False
 
     def clock(self):
+        # per-dot engine, the ppu is clocked every time and everything else comes off the scheduler
         self.ppu.clock()
 
-        #self.apu.clock()
+        if self.system_clock_count >= self.scheduler.next_clock:
+            self.scheduler.run(self.system_clock_count)
 
-        if self.system_clock_count % 3 == 0: # cpu only clocks once every 3 system clocks
-            # Direct memory access
-            if self.dma_enable:
-                if self.dma_wait:
-                    if self.system_clock_count % 2 == 1:
-                        self.dma_wait = False # we are now starting on the correct clock cycle
-                    
-                else:
-                    if self.system_clock_count % 2 == 0:
-                        self.dma_value = self.read((self.dma_page << 8) | self.dma_addr)
-                    
-                    else:
-                        self.write(0x2004, self.dma_value)
+        self.system_clock_count += 1
 
-                        self.dma_addr = (self.dma_addr + 1) & 0xFF
+    def clock_cpu(self):
+        self.cpu.clock() # sits out the cycles an OAM DMA halted it for
 
-                        if self.dma_addr == 0x00:
-                            self.dma_enable = False
-                            self.dma_wait = True
+        self.check_interrupts() # a register write can raise an nmi straight away
 
-            else:
-                # DMA isn't happening so we can actually clock the cpu
-                self.cpu.clock()
+    def step_apu(self):
+        # keeps the apu's write log short and its length counters current between frames
+        self.apu.run(self.cpu.clock_count)
 
-        self.audio_time += self.audio_time_per_clock
+        self.scheduler.schedule(max(self.apu.step_clock * 3, self.system_clock_count + 3), self.step_apu)
 
-        #if self.audio_time >= self.audio_system_per_system_sample:
-        #    self.audio_time -= self.audio_system_per_system_sample
-        #    self.audio_sample = self.apu.get_sample()
+    def raise_interrupt(self):
+        # called by the ppu as it raises an nmi or the mapper raises an irq on a scanline,
+        # the catch-up engine looks for them after every step anyway
+        if self.engine == ENGINE_DOT:
+            self.scheduler.schedule(self.system_clock_count, self.check_interrupts)
 
+    def check_interrupts(self):
         if self.ppu.nmi:
             self.ppu.nmi = False
             self.cpu.non_maskable_interrupt()
@@ -155,4 +344,75 @@ class Bus():
             self.cartridge.mapper.irq_clear()
             self.cpu.interrupt_request()
 
-        self.system_clock_count += 1
+    def step(self):
+        # catch-up engine, the cpu runs a whole instruction and the ppu only gets clocked when the cpu could notice
+        cpu = self.cpu
+        pc = cpu.pc
+
+        cpu.step()
+
+        # jumped backwards, could be the end of a loop, but once the frame is done the skip would run into the next one
+        if cpu.pc <= pc and self.idle_skip and not self.ppu.frame_complete:
+            self.idle_loop(cpu.pc, pc)
+
+        if cpu.clock_count * 3 >= self.event_clock_count:
+            self.catch_up()
+
+        if self.ppu.nmi:
+            self.ppu.nmi = False
+            self.idle_head = -1
+            cpu.non_maskable_interrupt()
+        
+        if self.cartridge.mapper.irq_state():
+            self.cartridge.mapper.irq_clear()
+            self.idle_head = -1
+            cpu.interrupt_request()
+
+    def idle_loop(self, head: int, tail: int):
+        # called when the step that started at tail jumped back to head, skips whole iterations of a loop that is only
+        # waiting for the ppu up to just before the next thing the ppu could raise
+        cpu = self.cpu
+        state = (cpu.a, cpu.x, cpu.y, cpu.s, cpu.status, cpu.nz)
+
+        if head != self.idle_head or tail != self.idle_tail:
+            self.idle_head = head
+            self.idle_tail = tail
+            self.idle_cycles = 0
+
+            if (head < 0x2000 or head >= 0x4020) and (tail < 0x2000 or tail >= 0x4020):
+                self.idle_cycles, self.idle_polls = loop_cycles(lambda addr: self.read(addr & 0xFFFF, True), head, tail)
+
+        elif (
+            self.idle_cycles and not cpu.cycles and state == self.idle_state
+            and cpu.clock_count - self.idle_clock == self.idle_cycles
+        ):
+            # nothing changed over a whole iteration, so nothing will until the ppu gets to its next event,
+            # keep one iteration back so the loop itself sees the event happen
+            limit = min(self.event_clock_count, self.budget_clock_count)
+
+            if self.idle_polls:
+                limit = min(limit, self.system_clock_count + self.ppu.dots_until_status_change())
+
+            iterations = (limit - cpu.clock_count * 3) // (self.idle_cycles * 3) - 1
+
+            if iterations > 0:
+                cpu.clock_count += iterations * self.idle_cycles
+                self.skipped_cycles += iterations * self.idle_cycles
+
+        self.idle_clock = cpu.clock_count
+        self.idle_state = state
+
+    def catch_up(self):
+        # clock the ppu until it is level with the cpu, then work out how far it can be left behind next
+        target = self.cpu.clock_count * 3
+        ppu = self.ppu
+
+        while self.system_clock_count < target:
+            if ppu.cycle == 0 and ppu.render_scanlines and target - self.system_clock_count >= ppu.scanline_dots():
+                # nothing can touch the ppu before this line is over, so it can be done in one go
+                self.system_clock_count += ppu.clock_scanline()
+            else:
+                ppu.clock()
+                self.system_clock_count += 1
+
+        self.event_clock_count = self.system_clock_count + ppu.dots_until_event()
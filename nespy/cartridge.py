@@ -1,6 +1,5 @@
-import io
-
 from nespy.mapper import *
+from nespy.tile_cache import TileCache
 from nespy.const import *
 
 class Cartridge():
@@ -9,78 +8,76 @@ class Cartridge():
     mapper_id: int = 0
     prg_banks: int = 0
     chr_banks: int = 0
-    prg_memory: list = None
-    chr_memory: list = None
+    prg_memory: bytearray = None
+    chr_memory: bytearray = None
+    chr_tiles: TileCache = None # chr_memory decoded into tiles
 
     hardware_mirror: int = MIRROR_HORIZONTAL
 
     def __init__(self, rom_path: str):
-        rom_file = open(rom_path, "rb")
-
-        stream = io.BytesIO(rom_file.read())
+        # the whole file is read once and the PRG and CHR regions copied straight out of it
+        with open(rom_path, "rb") as rom_file:
+            rom = memoryview(rom_file.read())
     
         # read in the header of the file
-        name = stream.read(4).decode("ascii")
-        prg_rom_chunks = int.from_bytes(stream.read(1), 'little')
-        chr_rom_chunks = int.from_bytes(stream.read(1), 'little')
-        mapper_1 = int.from_bytes(stream.read(1), 'little')
-        mapper_2 = int.from_bytes(stream.read(1), 'little')
-        prg_ram_size = int.from_bytes(stream.read(1), 'little')
-        tv_system_1 = int.from_bytes(stream.read(1), 'little')
-        tv_system_2 = int.from_bytes(stream.read(1), 'little')
+        name = bytes(rom[0:4]).decode("ascii")
+        prg_rom_chunks = rom[4]
+        chr_rom_chunks = rom[5]
+        mapper_1 = rom[6]
+        mapper_2 = rom[7]
+        prg_ram_size = rom[8]
+        tv_system_1 = rom[9]
+        tv_system_2 = rom[10]
 
-        stream.read(5) # unused bytes
+        offset = 16 # 5 unused bytes end the header
 
-        if mapper_1 & 0x04: # trainer exists, seek past it
-            stream.seek(512)
+        if mapper_1 & 0x04: # trainer exists, skip past it
+            offset += 512
 
         self.mapper_id = ((mapper_2 >> 4) << 4) | (mapper_1 >> 4)
 
         # load hardware mirror
         self.hardware_mirror = MIRROR_VERTICAL if (mapper_1 & 1) else MIRROR_HORIZONTAL
 
+        if mapper_1 & 0x08: # the cartridge brings its own VRAM for the other two nametables
+            self.hardware_mirror = MIRROR_FOUR_SCREEN
+
         # file types
         file_type = 2 if (mapper_2 & 0x0C) == 0x08 else 1
 
         if file_type == 1:
             self.prg_banks = prg_rom_chunks
-            self.prg_memory = [0x00 for i in range(0x4000 * self.prg_banks)]
-
-            for i in range(len(self.prg_memory)):
-                self.prg_memory[i] = int.from_bytes(stream.read(1), 'little')
-            
             self.chr_banks = chr_rom_chunks
 
-            if self.chr_banks == 0:
-                self.chr_memory = [0x00 for i in range(0x2000)]
-            else:
-                self.chr_memory = [0x00 for i in range(0x2000 * self.chr_banks)]
-            
-            for i in range(len(self.chr_memory)):
-                self.chr_memory[i] = int.from_bytes(stream.read(1), 'little')
-
-
         elif file_type == 2:
             self.prg_banks = ((prg_ram_size & 0x07) << 8) | prg_rom_chunks
-            self.prg_memory = [0x00 for i in range(0x4000 * self.prg_banks)]
-
-            for i in range(len(self.prg_memory)):
-                self.prg_memory[i] = int.from_bytes(stream.read(1), 'little')
-            
             self.chr_banks = ((prg_ram_size & 0x38) << 8) | chr_rom_chunks
-            self.chr_memory = [0x00 for i in range(0x2000 * self.chr_banks)]
 
-            for i in range(len(self.chr_memory)):
-                self.chr_memory[i] = int.from_bytes(stream.read(1), 'little')
-        
+        prg_size = 0x4000 * self.prg_banks
+        chr_size = 0x2000 * self.chr_banks
+
+        # a file cut short leaves the rest zeroed
+        self.prg_memory = bytearray(rom[offset:offset + prg_size]).ljust(prg_size, b"\x00")
+        offset += prg_size
+
+        if self.chr_banks == 0: # the cartridge has 8KB of CHR RAM instead
+            self.chr_memory = bytearray(0x2000)
+        else:
+            self.chr_memory = bytearray(rom[offset:offset + chr_size]).ljust(chr_size, b"\x00")
+
         assert self.mapper_id in MAPPER_LOOKUP, f"unimplemented mapper id: {self.mapper_id}"
 
         self.mapper = MAPPER_LOOKUP[self.mapper_id](self.prg_banks, self.chr_banks)
+        self.mapper.attach(self.prg_memory, self.chr_memory)
 
-        stream.close()
-        rom_file.close()
+        self.chr_tiles = TileCache(self.chr_memory)
 
     def cpu_read(self, addr: int) -> int:
+        slot = self.mapper.prg_slots[addr >> 13]
+
+        if slot is not None:
+            return slot[0][slot[1] + (addr & 0x1FFF)]
+
         out = self.mapper.map_cpu_read(addr)
 
         if out is not None:
@@ -93,6 +90,31 @@ class Cartridge():
 
         return None
     
+    def cpu_page(self, addr: int) -> tuple:
+        """
+        Get the (memory, offset) backing the 256 byte page starting at addr, None if it isn't plain memory
+        """
+        page_memory = self.mapper.map_cpu_memory(addr)
+
+        if page_memory is not None: # memory the mapper keeps itself, like PRG RAM
+            return page_memory
+
+        slot = self.mapper.prg_slots[addr >> 13]
+
+        if slot is not None:
+            return (slot[0], slot[1] + (addr & 0x1F00))
+
+        first = self.mapper.map_cpu_read(addr)
+        last = self.mapper.map_cpu_read(addr | 0xFF)
+
+        if first is None or last is None or first[0] == 0xFFFFFFFF:
+            return None
+
+        if last[0] - first[0] != 0xFF: # the page is split between banks
+            return None
+
+        return (self.prg_memory, first[0])
+
     def cpu_write(self, addr: int, value: int) -> bool:
         mapped_addr = self.mapper.map_cpu_write(addr, value)
 
@@ -105,6 +127,12 @@ class Cartridge():
         return False
 
     def ppu_read(self, addr: int):
+        if addr <= 0x1FFF:
+            slot = self.mapper.chr_slots[addr >> 10]
+
+            if slot is not None:
+                return slot[0][slot[1] + (addr & 0x03FF)]
+
         mapped_addr = self.mapper.map_ppu_read(addr)
 
         if mapped_addr is not None:
@@ -113,14 +141,43 @@ class Cartridge():
         return None
 
     def ppu_write(self, addr: int, value: int) -> bool:
+        if addr <= 0x1FFF and self.mapper.chr_writable:
+            slot = self.mapper.chr_slots[addr >> 10]
+
+            if slot is not None:
+                slot[0][slot[1] + (addr & 0x03FF)] = value
+
+                if slot[0] is self.chr_memory:
+                    self.chr_tiles.invalidate(slot[1] + (addr & 0x03FF))
+
+                return True
+
         mapped_addr = self.mapper.map_ppu_write(addr)
 
         if mapped_addr is not None:
             self.chr_memory[mapped_addr] = value
+            self.chr_tiles.invalidate(mapped_addr)
             return True
         
         return False
 
+    def pattern_table(self, addr: int):
+        """
+        Get the decoded tiles of the pattern table at addr ($0000 or $1000) as the mapper has it banked right now,
+        None if the table isn't one straight run of CHR memory
+        """
+        slots = self.mapper.chr_slots[addr >> 10:(addr >> 10) + 4]
+
+        if any(slot is None or slot[0] is not self.chr_memory for slot in slots):
+            return None
+
+        first = slots[0][1]
+
+        if any(slot[1] != first + i * CHR_SLOT_SIZE for i, slot in enumerate(slots)):
+            return None
+
+        return self.chr_tiles.table(first)
+
     def reset(self):
         if self.mapper:
             self.mapper.reset()
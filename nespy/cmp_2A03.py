@@ -1,31 +1,81 @@
-from typing import Callable
 from dataclasses import dataclass
 
-def apx_sin(t: float):
-    j = t * 0.15915
-    j = j - int(j)
-    return 20.785 * j * (j - 0.5) * (j - 1.0)
+import numpy as np
 
-APX_PI = 3.14159
+from nespy.blip_buffer import BlipBuffer
+from nespy.const import *
+
+# Block synthesis
+
+# the bus logs register writes with the cpu cycle they happened on instead of clocking the apu, run() replays them and
+# works out every level change of every channel with numpy for each stretch between two writes or frame sequencer
+# steps in one go, the changes go into band-limited buffers that turn them into samples at the output rate
+
+CYCLES_PER_SAMPLE = CPU_CLOCK_FREQ / AUDIO_SAMPLE_RATE
+
+QUARTER_FRAME = 1 # envelopes
+HALF_FRAME = 2 # length counters and sweeps
+
+# (cpu cycle into the sequence, what gets clocked) for the 4 and 5 step frame sequencer modes, and their lengths
+FRAME_STEPS = (
+    ((7457, QUARTER_FRAME), (14913, QUARTER_FRAME | HALF_FRAME), (22371, QUARTER_FRAME), (29829, QUARTER_FRAME | HALF_FRAME)),
+    ((7457, QUARTER_FRAME), (14913, QUARTER_FRAME | HALF_FRAME), (22371, QUARTER_FRAME), (37281, QUARTER_FRAME | HALF_FRAME)),
+)
+FRAME_LENGTHS = (29830, 37282)
+
+# the 8 steps of each pulse duty cycle
+PULSE_DUTY = np.array([
+    [0, 1, 0, 0, 0, 0, 0, 0],
+    [0, 1, 1, 0, 0, 0, 0, 0],
+    [0, 1, 1, 1, 1, 0, 0, 0],
+    [1, 0, 0, 1, 1, 1, 1, 1],
+], dtype=np.uint8)
+
+# cpu cycles between clocks of the noise shift register
+NOISE_PERIODS = (4, 8, 16, 32, 64, 96, 128, 160, 202, 254, 380, 508, 762, 1016, 2034, 4068)
+
+def noise_sequence(tap: int) -> np.ndarray:
+    # whether the noise channel is audible after each clock of its shift register, from power on until it repeats
+    state = 0x0001
+    audible = []
+
+    while True:
+        audible.append(~state & 0x0001)
+        state = (state >> 1) | (((state ^ (state >> tap)) & 0x0001) << 14)
+
+        if state == 0x0001:
+            return np.array(audible, dtype=np.uint8)
+
+# 32767 steps in the normal mode, 93 with the mode flag set
+NOISE_SEQUENCES = (noise_sequence(1), noise_sequence(6))
+
+# the nonlinear mixer, indexed by the sum of both pulse levels and by 3 * triangle + 2 * noise + dmc
+PULSE_TABLE = np.array([0.0] + [95.52 / (8128.0 / n + 100.0) for n in range(1, 31)])
+TND_TABLE = np.array([0.0] + [163.67 / (24329.0 / n + 100.0) for n in range(1, 203)])
+MIXER_PULSE_LEVELS = np.arange(len(PULSE_TABLE))
+MIXER_TND_LEVELS = np.arange(len(TND_TABLE))
+
+def level_changes(table: np.ndarray, volume: int, phase: float, period: float, start: int, end: int, level: int) -> tuple:
+    """
+    Get the cpu cycles and sizes of every level change of a channel stepping through table once every period cycles,
+    from phase on cpu cycle start up to end, level is what it was outputting before start, also returns the last level
+    """
+    if volume:
+        steps = np.concatenate(([phase], np.arange(np.floor(phase) + 1, phase + (end - start) / period)))
+        times = start + (steps - phase) * period
+        levels = table[steps.astype(np.int64) % len(table)].astype(np.int64) * volume
+    else:
+        times = np.array([start])
+        levels = np.zeros(1, dtype=np.int64)
+
+    deltas = np.diff(levels, prepend=level)
+    changed = deltas != 0
+
+    return times[changed], deltas[changed], int(levels[-1])
 
 @dataclass
 class Sequencer():
-    sequence = 0x00000000
-    new_sequence = 0x00000000
-    timer = 0x0000
-    reload = 0x0000
-    output = 0x00
-
-    def clock(self, enable: bool, func: Callable):
-        if enable:
-            self.timer = (self.timer - 1) & 0xFFFF
-
-            if self.timer == 0xFFFF:
-                self.timer = self.reload
-                self.sequence = func(self.sequence)
-                self.output = self.sequence & 0x1
-        
-        return self.output
+    reload = 0x0000 # timer period, a step of the sequence takes reload + 1 apu cycles
 
 @dataclass
 class LengthCounter():
@@ -53,11 +103,11 @@ class Envelope():
             if self.divider_count == 0:
                 self.divider_count = self.volume
 
-                if self.decay_count == 0 and loop:
+                if self.decay_count > 0:
+                    self.decay_count -= 1
+
+                elif loop: # a one-shot envelope stays silent at 0
                     self.decay_count = 15
-                
-                else:
-                    self.decay_count = (self.decay_count - 1) & 0xFFFF
             
             else:
                 self.divider_count = (self.divider_count - 1) & 0xFFFF
@@ -73,24 +123,6 @@ class Envelope():
         else:
             self.output = self.decay_count
 
-class Oscpulse():
-    frequency: float = 0
-    dutycycle: float = 0
-    amplitude: float = 1
-    harmonics: float = 20
-
-    def sample(self, t: float):
-        a = 0
-        b = 0
-        p = self.dutycycle * 2 * APX_PI
-
-        for n in range(1, self.harmonics+1):
-            c = n * self.frequency * 2 * APX_PI * t
-            a += -apx_sin(c) / n
-            b += -apx_sin(c - p * n) / n
-        
-        return (2 * self.amplitude / APX_PI) * (a - b)
-
 @dataclass
 class Sweeper():
     enabled: bool = False
@@ -111,101 +143,94 @@ class Sweeper():
         changed = False
 
         if self.timer == 0 and self.enabled and self.shift > 0 and not self.mute:
-            if self.target >= 8 and self.change < 0x077F:
+            if target >= 8 and self.change < 0x077F:
                 if self.down:
-                    target -= self.change - channel
+                    target -= self.change + (not channel) # pulse 1 subtracts one more
                 else:
                     target += self.change
                 
                 changed = True
             
-            if self.timer == 0 or self.reload:
-                self.timer = self.period
-                self.reload = False
-            else:
-                self.timer -= 1
+        if self.timer == 0 or self.reload:
+            self.timer = self.period
+            self.reload = False
+        else:
+            self.timer -= 1
 
-            self.mute = (target < 8) or (target > 0x07FF)
+        self.mute = (target < 8) or (target > 0x07FF)
 
-            return target if changed else None
+        return target if changed else None
 
 class Cmp2A03():
-    frame_clock_counter: int = 0x00000000
-    clock_counter: int = 0x00000000
     use_raw_mode: bool = False
 
     length_table: list = [10, 254, 20, 2, 40, 4, 80, 6, 160, 8, 60, 10, 14, 12, 26, 14, 12, 16, 24, 18, 48, 20, 96, 22, 192, 24, 72, 26, 16, 28, 32, 30]
 
-    global_time: float = 0.0
-
     pulse1_enable: bool = False
     pulse1_halt: bool = False
-    pulse1_sample: bool = 0.0
-    pulse1_output: float = 0.0
     pulse1_seq: Sequencer = None
-    pulse1_osc: Oscpulse = None
     pulse1_env: Envelope = None
     pulse1_lc: LengthCounter = None
     pulse1_sweep: Sweeper = None
 
     pulse2_enable: bool = False
     pulse2_halt: bool = False
-    pulse2_sample: bool = 0.0
-    pulse2_output: float = 0.0
     pulse2_seq: Sequencer = None
-    pulse2_osc: Oscpulse = None
     pulse2_env: Envelope = None
     pulse2_lc: LengthCounter = None
     pulse2_sweep: Sweeper = None
 
     noise_enable: bool = False
     noise_halt: bool = False
-    noise_sample: bool = 0.0
-    noise_output: float = 0.0
-    noise_seq: Sequencer = None
     noise_env: Envelope = None
     noise_lc: LengthCounter = None
 
+    pulse1_duty: int = 0
+    pulse2_duty: int = 0
+    noise_period: int = 0
+    noise_mode: int = 0 # 1 for the short sequence
+
+    frame_mode: int = 0 # 0 for the 4 step frame sequence, 1 for 5 steps
+
+    writes: list = None # (cpu cycle, addr, value) logged by write and not applied yet
+    cpu_clock: int = 0 # cpu cycle everything has been synthesized up to
+    frame_start: int = 0 # cpu cycle the current frame sequence started on
+    sequencer_step: int = 0
+    step_clock: int = 0 # cpu cycle of the next frame sequencer step
+
+    # where each channel is in its sequence in steps, and the level it is outputting
+    pulse_phase: list = None
+    pulse_level: list = None
+    noise_phase: float = 0.0
+    noise_level: int = 0
+
+    pulse_blip: BlipBuffer = None # both pulse channels summed
+    noise_blip: BlipBuffer = None
+
+    samples: list = None # synthesized blocks that haven't been read yet
+
     def __init__(self):
         self.pulse1_seq = Sequencer()
-        self.pulse1_osc = Oscpulse()
         self.pulse1_env = Envelope()
         self.pulse1_lc = LengthCounter()
         self.pulse1_sweep = Sweeper()
 
         self.pulse2_seq = Sequencer()
-        self.pulse2_osc = Oscpulse()
         self.pulse2_env = Envelope()
         self.pulse2_lc = LengthCounter()
         self.pulse2_sweep = Sweeper()
 
-        self.noise_seq = Sequencer()
         self.noise_env = Envelope()
         self.noise_lc = LengthCounter() 
 
-        self.noise_seq.sequence = 0xDBFB
+        self.pulse_blip = BlipBuffer(CYCLES_PER_SAMPLE)
+        self.noise_blip = BlipBuffer(CYCLES_PER_SAMPLE)
+
+        self.reset()
 
     def cpu_write(self, addr: int, value: int):
         if addr == 0x4000:
-            r = (value & 0xC0) >> 6
-
-            if r == 0x00:
-                self.pulse1_seq.new_sequence = 0b01000000
-                self.pulse1_osc.dutycycle = 0.125
-
-            elif r == 0x01:
-                self.pulse1_seq.new_sequence = 0b01100000
-                self.pulse1_osc.dutycycle = 0.250
-
-            elif r == 0x02:
-                self.pulse1_seq.new_sequence = 0b01111000
-                self.pulse1_osc.dutycycle = 0.500
-
-            elif r == 0x03:
-                self.pulse1_seq.new_sequence = 0b10011111
-                self.pulse1_osc.dutycycle = 0.750
-            
-            self.pulse1_seq.sequence = self.pulse1_seq.new_sequence
+            self.pulse1_duty = (value & 0xC0) >> 6
             self.pulse1_halt = bool(value & 0x20)
             self.pulse1_env.volume = value & 0x0F
             self.pulse1_env.disable = bool(value & 0x10)
@@ -218,35 +243,16 @@ class Cmp2A03():
             self.pulse1_sweep.reload = True
 
         elif addr == 0x4002:
-            self.pulse1_seq.reload = bool((self.pulse1_seq.reload & 0xFF00) | value)
+            self.pulse1_seq.reload = (self.pulse1_seq.reload & 0xFF00) | value
         
         elif addr == 0x4003:
             self.pulse1_seq.reload = ((value & 0x07) << 8) | (self.pulse1_seq.reload & 0x00FF)
-            self.pulse1_seq.timer = self.pulse1_seq.reload
-            self.pulse1_seq.sequence = self.pulse1_seq.new_sequence
             self.pulse1_lc.counter = self.length_table[(value & 0xF8) >> 3]
             self.pulse1_env.start = True
+            self.pulse_phase[0] = 0.0
         
         if addr == 0x4004:
-            r = (value & 0xC0) >> 6
-
-            if r == 0x00:
-                self.pulse2_seq.new_sequence = 0b01000000
-                self.pulse2_osc.dutycycle = 0.125
-
-            elif r == 0x01:
-                self.pulse2_seq.new_sequence = 0b01100000
-                self.pulse2_osc.dutycycle = 0.250
-
-            elif r == 0x02:
-                self.pulse2_seq.new_sequence = 0b01111000
-                self.pulse2_osc.dutycycle = 0.500
-
-            elif r == 0x03:
-                self.pulse2_seq.new_sequence = 0b10011111
-                self.pulse2_osc.dutycycle = 0.750
-            
-            self.pulse2_seq.sequence = self.pulse2_seq.new_sequence
+            self.pulse2_duty = (value & 0xC0) >> 6
             self.pulse2_halt = bool(value & 0x20)
             self.pulse2_env.volume = value & 0x0F
             self.pulse2_env.disable = bool(value & 0x10)
@@ -259,128 +265,196 @@ class Cmp2A03():
             self.pulse2_sweep.reload = True
 
         elif addr == 0x4006:
-            self.pulse2_seq.reload = bool((self.pulse2_seq.reload & 0xFF00) | value)
+            self.pulse2_seq.reload = (self.pulse2_seq.reload & 0xFF00) | value
         
         elif addr == 0x4007:
             self.pulse2_seq.reload = ((value & 0x07) << 8) | (self.pulse2_seq.reload & 0x00FF)
-            self.pulse2_seq.timer = self.pulse2_seq.reload
-            self.pulse2_seq.sequence = self.pulse2_seq.new_sequence
             self.pulse2_lc.counter = self.length_table[(value & 0xF8) >> 3]
             self.pulse2_env.start = True
+            self.pulse_phase[1] = 0.0
         
+        elif addr == 0x400C:
+            self.noise_halt = bool(value & 0x20)
+            self.noise_env.volume = value & 0x0F
+            self.noise_env.disable = bool(value & 0x10)
+
         elif addr == 0x400E:
-            self.noise_seq.reload = (0, 4, 8, 16, 32, 64, 96, 128, 160, 202, 254, 380, 508, 1016, 2034, 4068)[value & 0x0F]
+            self.noise_period = value & 0x0F
+            self.noise_mode = (value & 0x80) >> 7
         
         elif addr == 0x4015:
             self.pulse1_enable = bool(value & 0x01)
             self.pulse2_enable = bool(value & 0x02)
             self.noise_enable = bool(value & 0x04)
 
-            if not self.pulse1_enable: self.pulse1_lc.counter = 0
-            if not self.pulse2_enable: self.pulse2_lc.counter = 0
-            if not self.noise_enable: self.noise_lc.counter = 0
+            # disabling a channel silences it straight away
+            if not self.pulse1_enable:
+                self.pulse1_lc.counter = 0
+            if not self.pulse2_enable:
+                self.pulse2_lc.counter = 0
+            if not self.noise_enable:
+                self.noise_lc.counter = 0
 
         elif addr == 0x400F:
-            self.pulse1_env.start = True
-            self.pulse2_env.start = True
             self.noise_env.start = True
             self.noise_lc.counter = self.length_table[(value & 0xF8) >> 3]
 
         elif addr == 0x4017:
-            self.frame_clock_counter = value
-
-            if self.frame_clock_counter & 0x80:
-                self.pulse1_lc.clock(self.pulse1_enable, self.pulse1_halt)
-                self.pulse2_lc.clock(self.pulse2_enable, self.pulse2_halt)
-                self.noise_lc.clock(self.noise_enable, self.noise_halt)
-                self.pulse1_sweep.clock(self.pulse1_seq.reload, 0)
-                self.pulse2_sweep.clock(self.pulse2_seq.reload, 1)
-                self.pulse1_seq.clock(self.pulse1_enable, lambda s: ((s & 0x0001) << 7) | ((s & 0x00FE) >> 1))
-                self.pulse2_seq.clock(self.pulse2_enable, lambda s: ((s & 0x0001) << 7) | ((s & 0x00FE) >> 1))
-                self.noise_seq.clock(self.noise_enable, lambda s: (((s & 0x0001) ^ ((s & 0x0002) >> 1)) << 14) | ((s & 0x7FFF) >> 1))
+            # restarts the frame sequence, the 5 step one clocks everything straight away
+            self.frame_mode = (value & 0x80) >> 7
+            self.frame_start = self.cpu_clock
+            self.sequencer_step = 0
+            self.step_clock = self.frame_start + FRAME_STEPS[self.frame_mode][0][0]
+
+            if self.frame_mode:
+                self.quarter_frame()
+                self.half_frame()
 
     def cpu_read(self, addr: int) -> int:
         if addr == 0x4015:
-            return (0x01 if (self.pulse1_lc.counter > 0) else 0x00) | (0x02 if (self.pulse1_lc.counter > 0) else 0x00) | (0x04 if (self.pulse1_lc.counter > 0) else 0x00)
+            return (0x01 if (self.pulse1_lc.counter > 0) else 0x00) | (0x02 if (self.pulse2_lc.counter > 0) else 0x00) | (0x04 if (self.noise_lc.counter > 0) else 0x00)
         
         return 0x00
 
-    def clock(self):
-        quarter_frame_clock = False
-        half_frame_clock = False
-
-        self.global_time += (1/3) / 1789773
+    def quarter_frame(self):
+        self.pulse1_env.clock(self.pulse1_halt)
+        self.pulse2_env.clock(self.pulse2_halt)
+        self.noise_env.clock(self.noise_halt)
 
-        if self.clock_counter & 6 == 0:
-            self.frame_clock_counter += 1
+    def half_frame(self):
+        self.pulse1_lc.clock(self.pulse1_enable, self.pulse1_halt)
+        self.pulse2_lc.clock(self.pulse2_enable, self.pulse2_halt)
+        self.noise_lc.clock(self.noise_enable, self.noise_halt)
 
-            if self.frame_clock_counter == 3729:
-                quarter_frame_clock = True
-            
-            elif self.frame_clock_counter == 7457:
-                quarter_frame_clock = True
-                half_frame_clock = True
-            
-            elif self.frame_clock_counter == 11186:
-                quarter_frame_clock = True
-            
-            elif self.frame_clock_counter == 14916:
-                quarter_frame_clock = True
-                half_frame_clock = True
-                self.frame_clock_counter = 0
-            
-            if quarter_frame_clock:
-                self.pulse1_env.clock(self.pulse1_halt)
-                self.pulse2_env.clock(self.pulse2_halt)
-                self.noise_env.clock(self.noise_halt)
-
-            if half_frame_clock:
-                self.pulse1_lc.clock(self.pulse1_enable, self.pulse1_halt)
-                self.pulse2_lc.clock(self.pulse2_enable, self.pulse2_halt)
-                self.noise_lc.clock(self.noise_enable, self.noise_halt)
-                self.pulse1_sweep.clock(self.pulse1_seq.reload, 0)
-                self.pulse2_sweep.clock(self.pulse2_seq.reload, 1)
-
-            self.pulse1_seq.clock(self.pulse1_enable, lambda s: ((s & 0x0001) << 7) | ((s & 0x00FE) >> 1))
-
-            self.pulse1_osc.frequency = 1789773 / (16 * (self.pulse1_seq.reload + 1))
-            self.pulse1_osc.amplitude = (self.pulse1_env.output - 1) / 16
-            self.pulse1_sample = self.pulse1_osc.sample(self.global_time)
-
-            if self.pulse1_lc.counter > 0 and self.pulse1_seq.timer >= 8 and not self.pulse1_sweep.mute and self.pulse1_env.output > 2:
-                self.pulse1_output += (self.pulse1_sample - self.pulse1_output) * 0.5
-            else:
-                self.pulse1_output = 0
+        period = self.pulse1_sweep.clock(self.pulse1_seq.reload, 0)
+        if period is not None:
+            self.pulse1_seq.reload = period
 
+        period = self.pulse2_sweep.clock(self.pulse2_seq.reload, 1)
+        if period is not None:
+            self.pulse2_seq.reload = period
 
-            self.pulse2_seq.clock(self.pulse2_enable, lambda s: ((s & 0x0001) << 7) | ((s & 0x00FE) >> 1))
+    def pulse_volume(self, enable: bool, seq: Sequencer, env: Envelope, lc: LengthCounter, sweep: Sweeper) -> int:
+        sweep.track(seq.reload)
 
-            self.pulse2_osc.frequency = 1789773 / (16 * (self.pulse2_seq.reload + 1))
-            self.pulse2_osc.amplitude = (self.pulse2_env.output - 1) / 16
-            self.pulse2_sample = self.pulse2_osc.sample(self.global_time)
+        if enable and lc.counter > 0 and seq.reload >= 8 and not sweep.mute:
+            return min(env.volume if env.disable else env.decay_count, 15)
 
-            if self.pulse2_lc.counter > 0 and self.pulse2_seq.timer >= 8 and not self.pulse2_sweep.mute and self.pulse2_env.output > 2:
-                self.pulse2_output += (self.pulse2_sample - self.pulse2_output) * 0.5
-            else:
-                self.pulse2_output = 0
-            
-            
-            self.noise_seq.clock(self.noise_enable, lambda s: (((s & 0x0001) ^ ((s & 0x0002) >> 1)) << 14) | ((s & 0x7FFF) >> 1))
+        return 0
 
-            if self.noise_lc.counter > 0 and self.noise_seq.timer >= 8:
-                self.noise_output = self.noise_seq.output * (self.noise_env.output - 1) / 16
-            
-            if not self.pulse1_enable: self.pulse1_output = 0
-            if not self.pulse2_enable: self.pulse2_output = 0
-            if not self.noise_enable: self.noise_output = 0
-        
-        self.pulse1_sweep.track(self.pulse1_seq.reload)
-        self.pulse2_sweep.track(self.pulse2_seq.reload)
+    def noise_volume(self) -> int:
+        if self.noise_enable and self.noise_lc.counter > 0:
+            return min(self.noise_env.volume if self.noise_env.disable else self.noise_env.decay_count, 15)
 
-        self.clock_counter += 1
+        return 0
 
     def reset(self):
-        pass
+        self.writes = []
+        self.samples = []
+        self.cpu_clock = 0
+        self.frame_mode = 0
+        self.frame_start = 0
+        self.sequencer_step = 0
+        self.step_clock = FRAME_STEPS[0][0][0]
+        self.pulse_phase = [0.0, 0.0]
+        self.pulse_level = [0, 0]
+        self.noise_phase = 0.0
+        self.noise_level = 0
+        self.pulse_blip.reset()
+        self.noise_blip.reset()
+
+    def write(self, clock: int, addr: int, value: int):
+        # a register write on cpu cycle clock, it only takes effect once run gets there
+        self.writes.append((clock, addr, value))
+
+    def run(self, clock: int):
+        """
+        Synthesize everything up to cpu cycle clock, applying the logged writes on the way
+        """
+        for time, addr, value in self.writes:
+            self.advance(time)
+            self.cpu_write(addr, value)
+
+        self.writes.clear()
+        self.advance(clock)
+
+        pulse = self.pulse_blip.read(clock)
+        noise = self.noise_blip.read(clock)
+
+        if len(pulse):
+            # the buffers hand back band-limited levels in between the table entries
+            self.samples.append((np.interp(pulse, MIXER_PULSE_LEVELS, PULSE_TABLE) + np.interp(2 * noise, MIXER_TND_LEVELS, TND_TABLE)).astype(np.float32))
+
+    def advance(self, clock: int):
+        while self.step_clock <= clock:
+            self.synthesize(self.step_clock)
+            self.step_frame()
+
+        self.synthesize(clock)
+
+    def step_frame(self):
+        steps = FRAME_STEPS[self.frame_mode]
+        clocks = steps[self.sequencer_step][1]
+
+        if clocks & QUARTER_FRAME:
+            self.quarter_frame()
+
+        if clocks & HALF_FRAME:
+            self.half_frame()
+
+        self.sequencer_step += 1
+
+        if self.sequencer_step == len(steps):
+            self.sequencer_step = 0
+            self.frame_start += FRAME_LENGTHS[self.frame_mode]
+
+        self.step_clock = self.frame_start + steps[self.sequencer_step][0]
+
+    def synthesize(self, end: int):
+        # every level change up to cpu cycle end, none of the channel settings change before then
+        start = self.cpu_clock
+
+        if end <= start:
+            return
+
+        self.pulse_changes(self.pulse1_enable, self.pulse1_seq, self.pulse1_env, self.pulse1_lc, self.pulse1_sweep, self.pulse1_duty, 0, start, end)
+        self.pulse_changes(self.pulse2_enable, self.pulse2_seq, self.pulse2_env, self.pulse2_lc, self.pulse2_sweep, self.pulse2_duty, 1, start, end)
+        self.noise_changes(start, end)
+
+        self.cpu_clock = end
+
+    def pulse_changes(self, enable: bool, seq: Sequencer, env: Envelope, lc: LengthCounter, sweep: Sweeper, duty: int, channel: int, start: int, end: int):
+        volume = self.pulse_volume(enable, seq, env, lc, sweep)
+        period = 2 * (seq.reload + 1)
+        phase = self.pulse_phase[channel]
+
+        if volume or self.pulse_level[channel]: # a silent channel staying silent changes nothing
+            times, deltas, self.pulse_level[channel] = level_changes(PULSE_DUTY[duty], volume, phase, period, start, end, self.pulse_level[channel])
+            self.pulse_blip.add_deltas(times, deltas)
+
+        self.pulse_phase[channel] = (phase + (end - start) / period) % 8
+
+    def noise_changes(self, start: int, end: int):
+        volume = self.noise_volume()
+        sequence = NOISE_SEQUENCES[self.noise_mode]
+        period = NOISE_PERIODS[self.noise_period]
+
+        if volume or self.noise_level:
+            times, deltas, self.noise_level = level_changes(sequence, volume, self.noise_phase, period, start, end, self.noise_level)
+            self.noise_blip.add_deltas(times, deltas)
+
+        self.noise_phase = (self.noise_phase + (end - start) / period) % len(sequence)
+
+    def adjust_rate(self, factor: float):
+        # scale the cpu cycles per output sample, keeps an audio buffer from running dry or over
+        self.pulse_blip.cycles_per_sample = CYCLES_PER_SAMPLE * factor
+        self.noise_blip.cycles_per_sample = CYCLES_PER_SAMPLE * factor
+
+    def read_samples(self) -> np.ndarray:
+        """
+        Take every sample synthesized since the last call
+        """
+        samples = np.concatenate(self.samples) if self.samples else np.zeros(0, dtype=np.float32)
+        self.samples.clear()
 
-    def get_sample(self):
-        return (1.0 * self.pulse1_output - 0.8) * 0.1 + (1.0 * self.pulse2_output - 0.8) * 0.1 + (2.0 * self.noise_output - 0.5) * 0.1
+        return samples
@@ -1,19 +1,117 @@
 from dataclasses import dataclass
 
+import numpy as np
+
 from nespy.cartridge import Cartridge
 from nespy.const import *
 
+# which of the four nametables each 1K slot from $2000 to $2FFF shows for every mirroring mode
+NAMETABLE_BANKS = {
+    MIRROR_HORIZONTAL: (0, 0, 1, 1),
+    MIRROR_VERTICAL: (0, 1, 0, 1),
+    MIRROR_ONSCREEN_LO: (0, 0, 0, 0),
+    MIRROR_ONSCREEN_HI: (1, 1, 1, 1),
+    MIRROR_FOUR_SCREEN: (0, 1, 2, 3),
+}
+
+# each emphasis bit in PPUMASK darkens the two color channels it doesn't name by this much
+EMPHASIS_ATTENUATION = 0.816328
+
+def emphasize(color: int, emphasis: int) -> int:
+    channels = [(color >> 16) & 0xFF, (color >> 8) & 0xFF, color & 0xFF]
+
+    for channel in range(3):
+        if emphasis & (1 << channel):
+            for other in range(3):
+                if other != channel:
+                    channels[other] *= EMPHASIS_ATTENUATION
+
+    return (round(channels[0]) << 16) | (round(channels[1]) << 8) | round(channels[2])
+
+# PAL_COLORS for every combination of the red, green and blue emphasis bits, PPUMASK >> 5
+EMPHASIS_COLORS = np.array([[emphasize(color, emphasis) for color in PAL_COLORS] for emphasis in range(8)], dtype=np.uint32)
+
+# the entry of tbl_palette behind each of the 32 palette addresses, the first color of every sprite palette is the
+# same as the background one
+PALETTE_ENTRIES = [addr & 0x0F if addr & 0x13 == 0x10 else addr for addr in range(32)]
+
+# a sprite line pixel is the palette index of the front most sprite there, 0 where none shows, plus these flags
+SPRITE_LINE_BEHIND = 0x20 # that sprite has priority behind the background
+SPRITE_LINE_ZERO = 0x40 # that sprite is sprite zero
+
+SPRITE_LINE_EMPTY = np.zeros(256, dtype=np.uint8)
+
+# columns of a sprite row in drawing order, unflipped and flipped
+SPRITE_COLUMNS = np.array([range(8), range(7, -1, -1)])
+
+def increment_y(v: int) -> int:
+    # move a loopy register down a pixel, wrapping coarse y into the next nametable after row 29
+    if (v & 0x7000) != 0x7000:
+        return v + 0x1000
+
+    v &= ~0x7000
+    coarse_y = (v >> 5) & 0x1F
+
+    if coarse_y == 29:
+        return (v & ~0x03E0) ^ 0x0800
+
+    if coarse_y == 31:
+        return v & ~0x03E0
+
+    return v + 0x0020
+
+# sprite line flags for the priority and palette bits of an attribute byte
+SPRITE_FLAGS = np.array([0x10 | ((attrib & SPRITE_PALETTE) << 2) | (SPRITE_LINE_BEHIND if attrib & SPRITE_PRIORITY else 0) for attrib in range(0x24)], dtype=np.uint8)
+
 class Cmp2C02():
     bus = None
 
-    tbl_name: list[list] = None
-    tbl_pattern: list[list] = None
-    tbl_palette: list = None
+    tbl_name: list[bytearray] = None # the last two are only there for four-screen cartridges
+    tbl_pattern: list[bytearray] = None
+    tbl_palette: bytearray = None
 
-    spr_screen: list[list[tuple]] = None
+    # tbl_palette resolved to 0xRRGGBB through the grayscale and emphasis bits of mask, one per palette address,
+    # None when a palette or mask write means it has to be worked out again
+    palette_colors: np.ndarray = None
+
+    # decoded tiles of the two pattern tables, None where a table has to be read through ppu_read
+    pattern_tables: list = None
+
+    # the mapper's (memory, offset) behind each 1K of $0000 to $1FFF, kept up to date by the mapper itself
+    chr_slots: list = None
+
+    # the nametable behind each 1K slot from $2000 to $2FFF, mirrored up to $3EFF
+    nametables: list = None
+    mirror: int = None # mirroring mode nametables was mapped for
+
+    # (240, 256) buffers of 0xRRGGBB pixels, the ppu draws into screen while frame holds the last finished frame,
+    # the two are swapped whenever a frame completes so frame can be read without copying it
+    screen: np.ndarray = None
+    frame: np.ndarray = None
 
     frame_complete: bool = False
 
+    # rows of the last frame get copied instead of drawn again when nothing they were drawn from has changed,
+    # the stamps count changes to the memory a row reads so they can be part of what it was drawn from
+    reuse_lines: bool = True
+    nametable_stamps: list = None # [nametable][tile row] bumped when a tile or attribute for that row changes
+    palette_stamp: int = 0
+    chr_stamp: int = 0 # bumped on CHR writes and when the pattern tables get switched
+
+    # what each row of screen and frame was drawn from, None where it can't be reused, and whether sprite zero hit
+    screen_keys: list = None
+    frame_keys: list = None
+    screen_hits: list = None
+    frame_hits: list = None
+
+    # rows of the frame being drawn that were copied from the last one or drawn, and the same for the last frame
+    lines_reused: int = 0
+    lines_rendered: int = 0
+    reuse_counts: tuple = (0, 0)
+
+    # draw the pixels of the current frame, without it only what the cpu can see is kept exact
+    render_frame: bool = True
+
     nmi: bool = False
 
     fine_x: int = 0x00
@@ -33,7 +131,11 @@ class Cmp2C02():
     bg_shifter_attrib_hwrd: int = 0x0000
 
     oam_addr: int = 0x00
-    oam: list = 0x00
+    oam: bytearray = None
+
+    # the sprites of the line being drawn, laid out into 256 pixels when the line before it evaluated them
+    sprite_line: np.ndarray = SPRITE_LINE_EMPTY
+    sprite_zero: bool = False # sprite zero is on sprite_line
 
     status: int = 0x00
     mask: int = 0x00
@@ -42,26 +144,31 @@ class Cmp2C02():
     odd_frame: bool = False
 
     open_bus: int = 0x00
+
+    # let the catch-up engine run whole scanlines through clock_scanline, clock stays the reference
+    render_scanlines: bool = True
     
-    @dataclass
+    # read only view of a loopy register split into its fields, for debugging
+    @dataclass(frozen=True)
     class RamAddrRegister:
         coarse_x: int = 0x00
         coarse_y: int = 0x00
         nametable_x: bool = False
         nametable_y: bool = False
         fine_y: int = 0x00
-        unused: int = 0x00
+
+        @classmethod
+        def unpack(cls, value: int):
+            return cls(
+                coarse_x = value & 0b11111,
+                coarse_y = (value >> 5) & 0b11111,
+                nametable_x = bool(value & 0b10000000000),
+                nametable_y = bool(value & 0b100000000000),
+                fine_y = (value >> 12) & 0b111,
+            )
 
         def pack(self) -> int:
-            return ((self.unused & 0b1) << 15) | ((self.fine_y & 0b111) << 12) | ((self.nametable_y & 0b1) << 11) | ((self.nametable_x & 0b1) << 10) | ((self.coarse_y & 0b11111) << 5) | (self.coarse_x & 0b11111)
-
-        def load(self, value):
-            self.unused = ((value & 0b1000000000000000) >> 15)
-            self.fine_y = ((value & 0b111000000000000) >> 12)
-            self.nametable_y = ((value & 0b100000000000) >> 11)
-            self.nametable_x = ((value & 0b10000000000) >> 10)
-            self.coarse_y = ((value & 0b1111100000) >> 5)
-            self.coarse_x = ((value & 0b11111) >> 0)
+            return ((self.fine_y & 0b111) << 12) | ((self.nametable_y & 0b1) << 11) | ((self.nametable_x & 0b1) << 10) | ((self.coarse_y & 0b11111) << 5) | (self.coarse_x & 0b11111)
     
     @dataclass
     class ObjectAttributeEntity:
@@ -70,21 +177,28 @@ class Cmp2C02():
         attribute: int = 0x00
         x: int = 0x00
 
-    vram_addr: RamAddrRegister = None
-    tram_addr: RamAddrRegister = None
+    # the loopy registers as 15 bit integers, yyy NN YYYYY XXXXX (fine y, nametable, coarse y, coarse x)
+    vram_addr: int = 0x0000
+    tram_addr: int = 0x0000
     
     def __init__(self, bus):
         self.bus = bus
 
-        self.vram_addr = self.RamAddrRegister()
-        self.tram_addr = self.RamAddrRegister()
+        self.screen = np.zeros((240, 256), dtype=np.uint32)
+        self.frame = np.zeros((240, 256), dtype=np.uint32)
 
-        self.spr_screen = [[0x00 for j in range(240)] for i in range(256)]
+        self.tbl_name = [bytearray(1024) for i in range(4)]
+        self.nametables = [self.tbl_name[0], self.tbl_name[0], self.tbl_name[1], self.tbl_name[1]]
+        self.tbl_pattern = [bytearray(4096) for i in range(2)]
+        self.tbl_palette = bytearray(32)
+        self.oam = bytearray(256)
+        self.pattern_tables = [None, None]
 
-        self.tbl_name = [[0x00 for j in range(1024)] for i in range(2)]
-        self.tbl_pattern = [[0x00 for j in range(4096)] for i in range(2)]
-        self.tbl_palette = [0x00 for i in range(32)]
-        self.oam = [0x00 for i in range(256)]
+        self.nametable_stamps = [[0 for row in range(32)] for i in range(4)]
+        self.screen_keys = [None for i in range(240)]
+        self.frame_keys = [None for i in range(240)]
+        self.screen_hits = [False for i in range(240)]
+        self.frame_hits = [False for i in range(240)]
 
     def reset(self):
         self.fine_x = 0
@@ -102,12 +216,16 @@ class Cmp2C02():
         self.bg_shifter_attrib_hwrd = 0
         self.status = 0x00
         self.mask = 0x00
+        self.palette_colors = None
         self.control = 0x00
-        self.vram_addr.load(0x0000)
-        self.tram_addr.load(0x0000)
+        self.vram_addr = 0x0000
+        self.tram_addr = 0x0000
         self.oam_addr = 0x00
         self.odd_frame = False
         self.open_bus = 0x00
+        self.sprite_line = SPRITE_LINE_EMPTY
+        self.sprite_zero = False
+        self.render_frame = True
 
     def cpu_read(self, addr: int, read_only: bool = False) -> int:
         if addr == 0x0002:
@@ -128,13 +246,13 @@ class Cmp2C02():
 
         if addr == 0x0007:
             value = self.ppu_data_buffer
-            self.ppu_data_buffer = self.ppu_read(self.vram_addr.pack())
+            self.ppu_data_buffer = self.ppu_read(self.vram_addr)
 
-            if (self.vram_addr.pack() & 0x3FFF) >= 0x3F00:
+            if (self.vram_addr & 0x3FFF) >= 0x3F00:
                 value = self.ppu_data_buffer
-                self.ppu_data_buffer = self.ppu_read(self.vram_addr.pack() - 0x1000)
+                self.ppu_data_buffer = self.ppu_read(self.vram_addr - 0x1000)
 
-            self.vram_addr.load(self.vram_addr.pack() + (32 if (self.control & INCREMENT_MODE) else 1))
+            self.vram_addr = (self.vram_addr + (32 if (self.control & INCREMENT_MODE) else 1)) & 0x7FFF
         
             return value
 
@@ -150,12 +268,14 @@ class Cmp2C02():
             if (not (old_ctrl & ENABLE_NMI) and (self.control & ENABLE_NMI) and (self.status & VERTICAL_BLANK)):
                 self.nmi = True
 
-            self.tram_addr.nametable_x = bool(self.control & NAMETABLE_X)
-            self.tram_addr.nametable_y = bool(self.control & NAMETABLE_Y)
+            self.tram_addr = (self.tram_addr & ~0x0C00) | ((self.control & (NAMETABLE_X | NAMETABLE_Y)) << 10)
 
             return
         
         if addr == 0x0001:
+            if (self.mask ^ value) & (GRAYSCALE | ENHANCE_RED | ENHANCE_GREEN | ENHANCE_BLUE):
+                self.palette_colors = None
+
             self.mask = value
             return
 
@@ -172,12 +292,11 @@ class Cmp2C02():
             # scroll
             if self.address_latch == 0:
                 self.fine_x = value & 0x07
-                self.tram_addr.coarse_x = value >> 3
+                self.tram_addr = (self.tram_addr & ~0x001F) | (value >> 3)
                 self.address_latch = 1
             
             else:
-                self.tram_addr.fine_y = value & 0x07
-                self.tram_addr.coarse_y = value >> 3
+                self.tram_addr = (self.tram_addr & ~0x73E0) | ((value & 0x07) << 12) | ((value >> 3) << 5)
                 self.address_latch = 0
             
             return
@@ -185,19 +304,19 @@ class Cmp2C02():
         if addr == 0x0006:
             # ppu address
             if self.address_latch == 0:
-                self.tram_addr.load(((value & 0x3F) << 8) | (self.tram_addr.pack() & 0x00FF))
+                self.tram_addr = ((value & 0x3F) << 8) | (self.tram_addr & 0x00FF)
                 self.address_latch = 1
 
             else:
-                self.tram_addr.load((self.tram_addr.pack() & 0xFF00) | value)
-                self.vram_addr.load(self.tram_addr.pack())
+                self.tram_addr = (self.tram_addr & 0xFF00) | value
+                self.vram_addr = self.tram_addr
                 self.address_latch = 0
             
             return
 
         if addr == 0x0007:
-            self.ppu_write(self.vram_addr.pack(), value)
-            self.vram_addr.load(self.vram_addr.pack() + (32 if (self.control & INCREMENT_MODE) else 1))
+            self.ppu_write(self.vram_addr, value)
+            self.vram_addr = (self.vram_addr + (32 if (self.control & INCREMENT_MODE) else 1)) & 0x7FFF
             return
 
 
@@ -214,90 +333,60 @@ class Cmp2C02():
             return self.tbl_palette[addr] & (0x30 if (self.mask & GRAYSCALE) else 0x3F)
         
 
-        out = self.cartridge.ppu_read(addr)
-        if out is not None:
-            return out
-        
         if addr <= 0x1FFF:
+            slot = self.chr_slots[addr >> 10]
+            if slot is not None:
+                return slot[0][slot[1] + (addr & 0x03FF)]
+
+            out = self.cartridge.ppu_read(addr)
+            if out is not None:
+                return out
+
             return self.tbl_pattern[(addr & 0x1000) >> 12][addr & 0x0FFF]
 
-        if 0x2000 <= addr <= 0x3EFF:
-            addr &= 0x0FFF
-
-            mirror = self.cartridge.get_mirror()
-
-            if mirror == MIRROR_VERTICAL:
-                if addr <= 0x03FF:
-                    return self.tbl_name[0][addr & 0x03FF]
-                if 0x0400 <= addr <= 0x07FF:
-                    return self.tbl_name[1][addr & 0x03FF]
-                if 0x0800 <= addr <= 0x0BFF:
-                    return self.tbl_name[0][addr & 0x03FF]
-                if 0x0C00 <= addr <= 0x0FFF:
-                    return self.tbl_name[1][addr & 0x03FF]
-
-            elif mirror == MIRROR_HORIZONTAL:
-                if addr <= 0x03FF:
-                    return self.tbl_name[0][addr & 0x03FF]
-                if 0x0400 <= addr <= 0x07FF:
-                    return self.tbl_name[0][addr & 0x03FF]
-                if 0x0800 <= addr <= 0x0BFF:
-                    return self.tbl_name[1][addr & 0x03FF]
-                if 0x0C00 <= addr <= 0x0FFF:
-                    return self.tbl_name[1][addr & 0x03FF]
+        if addr <= 0x3EFF:
+            return self.nametables[(addr >> 10) & 0x03][addr & 0x03FF]
 
         return value
 
     def ppu_write(self, addr: int, value: int):
         addr &= 0x3FFF
 
-        if self.cartridge.ppu_write(addr, value):
-            return
-        
         if addr <= 0x1FFF:
+            self.chr_stamp += 1
+
+            if self.cartridge.ppu_write(addr, value):
+                return
+
             self.tbl_pattern[(addr & 0x1000) >> 12][addr & 0x0FFF] = value
             return
         
-        if 0x2000 <= addr <= 0x3EFF:
-            addr &= 0x0FFF
-
-            mirror = self.cartridge.get_mirror()
-
-            if mirror == MIRROR_VERTICAL:
-                if addr <= 0x03FF:
-                    self.tbl_name[0][addr & 0x03FF] = value
-                    return
-                if 0x0400 <= addr <= 0x07FF:
-                    self.tbl_name[1][addr & 0x03FF] = value
-                    return
-                if 0x0800 <= addr <= 0x0BFF:
-                    self.tbl_name[0][addr & 0x03FF] = value
-                    return
-                if 0x0C00 <= addr <= 0x0FFF:
-                    self.tbl_name[1][addr & 0x03FF] = value
-                    return
-
-            elif mirror == MIRROR_HORIZONTAL:
-                if addr <= 0x03FF:
-                    self.tbl_name[0][addr & 0x03FF] = value
-                    return
-                if 0x0400 <= addr <= 0x07FF:
-                    self.tbl_name[0][addr & 0x03FF] = value
-                    return
-                if 0x0800 <= addr <= 0x0BFF:
-                    self.tbl_name[1][addr & 0x03FF] = value
-                    return
-                if 0x0C00 <= addr <= 0x0FFF:
-                    self.tbl_name[1][addr & 0x03FF] = value
-                    return
-            
+        if addr <= 0x3EFF:
+            nametable = self.nametables[(addr >> 10) & 0x03]
+
+            if nametable[addr & 0x03FF] != value:
+                nametable[addr & 0x03FF] = value
+                stamps = self.nametable_stamps[NAMETABLE_BANKS[self.mirror][(addr >> 10) & 0x03]]
+                stamps[(addr >> 5) & 0x1F] += 1
+
+                if (addr & 0x03FF) >= 0x03C0: # an attribute byte covers 4 rows of tiles
+                    for row in range(((addr >> 1) & 0x1C), ((addr >> 1) & 0x1C) + 4):
+                        stamps[row] += 1
+
+            return
+
         if 0x3F00 <= addr <= 0x3FFF:
             addr &= 0x001F
             if addr == 0x0010: addr = 0x0000
             elif addr == 0x0014: addr = 0x0004
             elif addr == 0x0018: addr = 0x0008
             elif addr == 0x001C: addr = 0x000C
-            self.tbl_palette[addr] = value
+
+            if self.tbl_palette[addr] != value:
+                self.tbl_palette[addr] = value
+                self.palette_colors = None
+                self.palette_stamp += 1
+
             return
 
     def clock(self):
@@ -322,47 +411,49 @@ class Cmp2C02():
                     self.bg_shifter_pattern_hwrd = (self.bg_shifter_pattern_hwrd & 0xFF00) | self.bg_next_tile_msb
                     self.bg_shifter_attrib_lwrd = (self.bg_shifter_attrib_lwrd & 0xFF00) | (0xFF if (self.bg_next_tile_attrib & 0x01) else 0x00)
                     self.bg_shifter_attrib_hwrd = (self.bg_shifter_attrib_hwrd & 0xFF00) | (0xFF if (self.bg_next_tile_attrib & 0x02) else 0x00)
-                    self.bg_next_tile_id = self.ppu_read(0x2000 | (self.vram_addr.pack() & 0x0FFF))
+                    self.bg_next_tile_id = self.ppu_read(0x2000 | (self.vram_addr & 0x0FFF))
 
                 elif k == 2:
-                    self.bg_next_tile_attrib = self.ppu_read(
-                        0x23C0 | (self.vram_addr.nametable_y << 11) | (self.vram_addr.nametable_x << 10) | ((self.vram_addr.coarse_y >> 2) << 3) | (self.vram_addr.coarse_x >> 2)
-                    )
+                    v = self.vram_addr
+                    self.bg_next_tile_attrib = self.ppu_read(0x23C0 | (v & 0x0C00) | ((v >> 4) & 0x38) | ((v >> 2) & 0x07))
 
-                    if self.vram_addr.coarse_y & 0x02: self.bg_next_tile_attrib >>= 4
-                    if self.vram_addr.coarse_x & 0x02: self.bg_next_tile_attrib >>= 2
+                    if v & 0x0040: self.bg_next_tile_attrib >>= 4 # coarse y bit 1
+                    if v & 0x0002: self.bg_next_tile_attrib >>= 2 # coarse x bit 1
                     self.bg_next_tile_attrib &= 0x03
 
                 elif k == 4:
-                    self.bg_next_tile_lsb = self.ppu_read((bool(self.control & PATTERN_BACKGROUND) << 12) + (self.bg_next_tile_id << 4) + self.vram_addr.fine_y) & 0xFF
+                    self.bg_next_tile_lsb = self.ppu_read((bool(self.control & PATTERN_BACKGROUND) << 12) + (self.bg_next_tile_id << 4) + (self.vram_addr >> 12)) & 0xFF
 
                 elif k == 6:
-                    self.bg_next_tile_msb = self.ppu_read((bool(self.control & PATTERN_BACKGROUND) << 12) + (self.bg_next_tile_id << 4) + self.vram_addr.fine_y + 8) & 0xFF
+                    self.bg_next_tile_msb = self.ppu_read((bool(self.control & PATTERN_BACKGROUND) << 12) + (self.bg_next_tile_id << 4) + (self.vram_addr >> 12) + 8) & 0xFF
 
                 elif k == 7:
                     if self.mask & (RENDER_BACKGROUND | RENDER_SPRITES):
-                        if self.vram_addr.coarse_x == 31:
-                            self.vram_addr.coarse_x = 0
-                            self.vram_addr.nametable_x = not self.vram_addr.nametable_x
+                        if (self.vram_addr & 0x001F) == 31: # wrap coarse x into the next nametable
+                            self.vram_addr = (self.vram_addr & ~0x001F) ^ 0x0400
                         else:
-                            self.vram_addr.coarse_x += 1
+                            self.vram_addr += 1
             
             if self.cycle == 256:
                 if self.mask & (RENDER_BACKGROUND | RENDER_SPRITES):
-                    if self.vram_addr.fine_y < 7:
-                        self.vram_addr.fine_y += 1
+                    v = self.vram_addr
+
+                    if (v & 0x7000) != 0x7000: # fine y < 7
+                        v += 0x1000
                     else:
-                        self.vram_addr.fine_y = 0
-                        
-                        if self.vram_addr.coarse_y == 29:
-                            self.vram_addr.coarse_y = 0
-                            self.vram_addr.nametable_y = not self.vram_addr.nametable_y
+                        v &= ~0x7000
+                        coarse_y = (v >> 5) & 0x1F
+
+                        if coarse_y == 29:
+                            v = (v & ~0x03E0) ^ 0x0800
                         
-                        elif self.vram_addr.coarse_y == 31:
-                            self.vram_addr.coarse_y = 0
+                        elif coarse_y == 31:
+                            v &= ~0x03E0
                         
                         else:
-                            self.vram_addr.coarse_y += 1
+                            v += 0x0020
+
+                    self.vram_addr = v
     
             if self.cycle == 257:
                 self.bg_shifter_pattern_lwrd = (self.bg_shifter_pattern_lwrd & 0xFF00) | self.bg_next_tile_lsb
@@ -371,17 +462,16 @@ class Cmp2C02():
                 self.bg_shifter_attrib_hwrd = (self.bg_shifter_attrib_hwrd & 0xFF00) | (0xFF if (self.bg_next_tile_attrib & 0x02) else 0x00)
 
                 if self.mask & (RENDER_BACKGROUND | RENDER_SPRITES):
-                    self.vram_addr.nametable_x = self.tram_addr.nametable_x
-                    self.vram_addr.coarse_x = self.tram_addr.coarse_x
+                    self.vram_addr = (self.vram_addr & ~0x041F) | (self.tram_addr & 0x041F)
+
+                self.evaluate_sprites()
             
             if self.scanline == -1 and (280 <= self.cycle < 305):
                 if self.mask & (RENDER_BACKGROUND | RENDER_SPRITES):
-                    self.vram_addr.fine_y = self.tram_addr.fine_y
-                    self.vram_addr.nametable_y = self.tram_addr.nametable_y
-                    self.vram_addr.coarse_y = self.tram_addr.coarse_y
+                    self.vram_addr = (self.vram_addr & ~0x7BE0) | (self.tram_addr & 0x7BE0)
 
             if self.cycle == 338 or self.cycle == 340:
-                self.bg_next_tile_id = self.ppu_read(0x2000 | (self.vram_addr.pack() & 0x0FFF))
+                self.bg_next_tile_id = self.ppu_read(0x2000 | (self.vram_addr & 0x0FFF))
         
         bg_pixel = 0x00
         bg_palette = 0x00
@@ -398,7 +488,28 @@ class Cmp2C02():
             bg_palette = (bg1 << 1) | bg0
 
         if 1 <= self.cycle <= 256 and 0 <= self.scanline < 240:
-            self.spr_screen[self.cycle - 1][self.scanline] = PAL_COLORS[self.ppu_read(0x3F00 + (bg_palette << 2) + bg_pixel) & 0x3F]
+            pixel = (bg_palette << 2) | bg_pixel if bg_pixel else 0x00 # the backdrop shows through background pixel 0
+
+            if self.mask & RENDER_SPRITES and ((self.mask & RENDER_SPRITES_LEFT) or (self.cycle >= 9)):
+                sprite = int(self.sprite_line[self.cycle - 1])
+
+                if sprite:
+                    if bg_pixel and sprite & SPRITE_LINE_ZERO and self.cycle != 256:
+                        self.status |= SPRITE_ZERO_HIT
+
+                    if not (bg_pixel and sprite & SPRITE_LINE_BEHIND):
+                        pixel = sprite & 0x1F
+
+            if self.render_frame:
+                if self.cycle == 1:
+                    self.screen_keys[self.scanline] = None
+                    self.lines_rendered += 1
+
+                colors = self.palette_colors
+                if colors is None:
+                    colors = self.resolve_palette()
+
+                self.screen[self.scanline, self.cycle - 1] = colors[pixel]
 
         elif 241 <= self.scanline < 261:
             if self.scanline == 241 and self.cycle == 1:
@@ -406,6 +517,7 @@ class Cmp2C02():
 
                 if self.control & ENABLE_NMI:
                     self.nmi = True
+                    self.bus.raise_interrupt()
 
         self.cycle += 1
 
@@ -413,14 +525,411 @@ class Cmp2C02():
             if self.cycle == 260 and self.scanline < 240:
                 self.cartridge.mapper.scanline()
 
+                if self.cartridge.mapper.irq_state():
+                    self.bus.raise_interrupt()
+
         if self.cycle >= 341:
             self.cycle = 0
             self.scanline += 1
 
             if self.scanline >= 261:
-                self.scanline = -1
-                self.frame_complete = True
-                self.odd_frame = not self.odd_frame
+                self.end_frame()
                 
+    @property
+    def vram_register(self) -> RamAddrRegister:
+        return self.RamAddrRegister.unpack(self.vram_addr)
+
+    @property
+    def tram_register(self) -> RamAddrRegister:
+        return self.RamAddrRegister.unpack(self.tram_addr)
+
+    def resolve_palette(self) -> np.ndarray:
+        grayscale = 0x30 if (self.mask & GRAYSCALE) else 0x3F
+        self.palette_colors = EMPHASIS_COLORS[self.mask >> 5][[self.tbl_palette[entry] & grayscale for entry in PALETTE_ENTRIES]]
+
+        return self.palette_colors
+
+    def map_nametables(self):
+        # called whenever the mapper could have changed the mirroring
+        mirror = self.cartridge.get_mirror()
+
+        if mirror != self.mirror:
+            self.mirror = mirror
+            self.nametables = [self.tbl_name[bank] for bank in NAMETABLE_BANKS[mirror]]
+
+    def map_pattern_tables(self):
+        # called whenever the mapper could have switched CHR banks
+        tables = [self.cartridge.pattern_table(0x0000), self.cartridge.pattern_table(0x1000)]
+
+        for old, new in zip(self.pattern_tables, tables):
+            if old is None or new is None or old.ctypes.data != new.ctypes.data:
+                self.chr_stamp += 1
+                break
+
+        self.pattern_tables = tables
+
+    def scanline_dots(self) -> int:
+        # dots left in the scanline when at cycle 0, the pre-render dot 0 is skipped on odd frames while rendering
+        if self.scanline == 0 and self.odd_frame and (self.mask & (RENDER_BACKGROUND | RENDER_SPRITES)):
+            return PPU_DOTS_PER_SCANLINE - 1
+
+        return PPU_DOTS_PER_SCANLINE
+
+    def clock_scanline(self) -> int:
+        """
+        Run a whole scanline from cycle 0, exactly like scanline_dots() calls to clock() would,
+        only valid as long as nothing touches the ppu until it is done, returns how many dots it took
+        """
+        dots = self.scanline_dots()
+        scanline = self.scanline
+
+        if -1 <= scanline < 240:
+            self.fetch_scanline()
+
+        elif scanline == 241:
+            self.status |= VERTICAL_BLANK
+
+            if self.control & ENABLE_NMI:
+                self.nmi = True
+
+        self.cycle = 0
+        self.scanline += 1
+
+        if self.scanline >= 261:
+            self.end_frame()
+
+        return dots
+
+    def end_frame(self):
+        self.scanline = -1
+        self.frame_complete = True
+        self.odd_frame = not self.odd_frame
+
+        # a frame that wasn't drawn leaves the last one that was in frame
+        if self.render_frame:
+            self.screen, self.frame = self.frame, self.screen
+            self.screen_keys, self.frame_keys = self.frame_keys, self.screen_keys
+            self.screen_hits, self.frame_hits = self.frame_hits, self.screen_hits
+
+            self.reuse_counts = (self.lines_reused, self.lines_rendered)
+            self.lines_reused = 0
+            self.lines_rendered = 0
+        else:
+            self.reuse_counts = (0, 0)
+
+        self.render_frame = self.bus.render_next_frame()
+
+    def fetch_scanline(self):
+        # replays the background fetches of a pre-render or visible scanline a tile at a time, then draws the
+        # pixels from the fetched tiles with numpy
+        render = self.mask & (RENDER_BACKGROUND | RENDER_SPRITES)
+        shift = self.mask & RENDER_BACKGROUND
+        ppu_read = self.ppu_read
+        nametables = self.nametables
+
+        v = self.vram_addr
+        t = self.tram_addr
+        pattern = 0x1000 if (self.control & PATTERN_BACKGROUND) else 0x0000
+        fine_y = (v >> 12) & 0x07
+
+        tiles = self.pattern_tables[pattern >> 12]
+        if tiles is not None:
+            self.cartridge.chr_tiles.update()
+
+        tile_id = self.bg_next_tile_id
+        tile_attrib = self.bg_next_tile_attrib
+        tile_lsb = self.bg_next_tile_lsb
+        tile_msb = self.bg_next_tile_msb
+
+        if self.scanline == -1:
+            self.status &= ~(VERTICAL_BLANK | SPRITE_OVERFLOW | SPRITE_ZERO_HIT)
+
+        draw = self.render_frame and 0 <= self.scanline < 240
+
+        # a line that isn't drawn still needs its background wherever sprite zero could hit it
+        hit_test = (
+            0 <= self.scanline < 240 and self.sprite_zero and not (self.status & SPRITE_ZERO_HIT)
+            and (self.mask & (RENDER_BACKGROUND | RENDER_SPRITES)) == (RENDER_BACKGROUND | RENDER_SPRITES)
+        )
+
+        reuse = False
+
+        if draw and self.reuse_lines:
+            key = self.line_key()
+            reuse = key == self.frame_keys[self.scanline]
+
+        # the tiles loaded into the shifters at cycles 9, 17, ... 257
+        loaded_id = []
+        loaded_lsb = []
+        loaded_msb = []
+        loaded_attrib = []
+
+        first_tile = 0
+
+        if reuse or not (draw or hit_test):
+            # nothing needs the tiles on this line, only where they leave v, 32 coarse x increments come back
+            # around to the same column in the other nametable, which cycle 257 resets anyway
+            first_tile = 32
+
+            if render:
+                v = increment_y(v)
+
+        for tile in range(first_tile, 34):
+            # tiles 0 to 31 are fetched over cycles 1 to 256, 32 and 33 over 321 to 336 for the next line
+            if tile == 32:
+                # cycle 257 loads the last tile again and fetches a tile id that is never used
+                if render:
+                    v = (v & ~0x041F) | (t & 0x041F)
+
+                    if self.scanline == -1:
+                        v = (v & ~0x7BE0) | (t & 0x7BE0)
+
+            elif tile == 33:
+                # cycle 329 loads the first tile for the next line, it ends up in the top half of the shifters
+                next_lsb, next_msb, next_attrib = tile_lsb, tile_msb, tile_attrib
+
+            if tile:
+                # every tile but the first fetches its id on the cycle the previous one is loaded into the shifters
+                tile_id = nametables[(v >> 10) & 0x03][v & 0x03FF]
+
+            tile_attrib = nametables[(v >> 10) & 0x03][0x03C0 | ((v >> 4) & 0x38) | ((v >> 2) & 0x07)]
+            if v & 0x0040: tile_attrib >>= 4
+            if v & 0x0002: tile_attrib >>= 2
+            tile_attrib &= 0x03
+
+            if tile < 32:
+                loaded_attrib.append(tile_attrib)
+
+            if tile < 32 and tiles is not None:
+                # the decoded tile row is all the pixels need, the bytes only matter for the last two tiles
+                loaded_id.append(tile_id)
+            else:
+                tile_lsb = ppu_read(pattern + (tile_id << 4) + ((v >> 12) & 0x07)) & 0xFF
+                tile_msb = ppu_read(pattern + (tile_id << 4) + ((v >> 12) & 0x07) + 8) & 0xFF
+
+                if tile < 32:
+                    loaded_lsb.append(tile_lsb)
+                    loaded_msb.append(tile_msb)
+
+            if render:
+                if (v & 0x001F) == 31:
+                    v = (v & ~0x001F) ^ 0x0400
+                else:
+                    v += 1
+
+                if tile == 31:
+                    v = increment_y(v)
+
+        # cycle 337 loads the second tile for the next line, 337, 338 and 340 fetch its tile id again
+        tile_id = nametables[(v >> 10) & 0x03][v & 0x03FF]
+
+        pattern_lwrd = self.bg_shifter_pattern_lwrd
+        pattern_hwrd = self.bg_shifter_pattern_hwrd
+        attrib_lwrd = self.bg_shifter_attrib_lwrd
+        attrib_hwrd = self.bg_shifter_attrib_hwrd
+
+        hit = False
+
+        if (draw or hit_test) and not reuse:
+            if shift:
+                # the shifters only ever show the next 16 bits of one long stream of tiles, starting with
+                # whatever they held at the start of the line
+                lo = np.unpackbits(np.array([pattern_lwrd >> 8, pattern_lwrd & 0xFF] + loaded_lsb, dtype=np.uint8))
+                hi = np.unpackbits(np.array([pattern_hwrd >> 8, pattern_hwrd & 0xFF] + loaded_msb, dtype=np.uint8))
+                pal_lo = np.unpackbits(np.array([attrib_lwrd >> 8, attrib_lwrd & 0xFF], dtype=np.uint8))
+                pal_hi = np.unpackbits(np.array([attrib_hwrd >> 8, attrib_hwrd & 0xFF], dtype=np.uint8))
+
+                stream = lo | (hi << 1)
+                if tiles is not None:
+                    stream = np.concatenate((stream, tiles[loaded_id, fine_y].ravel()))
+
+                attrib = np.repeat(np.array(loaded_attrib, dtype=np.uint8), 8)
+                palettes = np.concatenate((pal_lo | (pal_hi << 1), attrib)) << 2
+
+                x = self.fine_x
+                pixels = stream[x:x + 256] | palettes[x:x + 256]
+
+                if not (self.mask & RENDER_BACKGROUND_LEFT):
+                    pixels[:8] = 0
+
+            else:
+                pixels = np.zeros(256, dtype=np.uint8)
+
+            background = (pixels & 0x03) != 0
+            pixels = np.where(background, pixels, 0) # the backdrop shows through background pixel 0
+
+            if self.mask & RENDER_SPRITES and self.sprite_line is not SPRITE_LINE_EMPTY:
+                sprites = self.sprite_line
+
+                if not (self.mask & RENDER_SPRITES_LEFT):
+                    sprites = np.concatenate((SPRITE_LINE_EMPTY[:8], sprites[8:]))
+
+                # the background can only be opaque here when it is being drawn, and a hit never happens on x 255
+                hit = self.sprite_zero and np.any(background[:255] & ((sprites[:255] & SPRITE_LINE_ZERO) != 0))
+
+                if hit:
+                    self.status |= SPRITE_ZERO_HIT
+
+                front = (sprites != 0) & ~(background & ((sprites & SPRITE_LINE_BEHIND) != 0))
+                pixels = np.where(front, sprites & 0x1F, pixels)
+
+        if reuse:
+            self.screen[self.scanline] = self.frame[self.scanline]
+            hit = self.frame_hits[self.scanline]
+
+            if hit:
+                self.status |= SPRITE_ZERO_HIT
+
+            self.lines_reused += 1
+
+        elif draw:
+            colors = self.palette_colors
+            if colors is None:
+                colors = self.resolve_palette()
+
+            self.screen[self.scanline] = colors[pixels]
+            self.lines_rendered += 1
+
+        if draw:
+            self.screen_keys[self.scanline] = key if self.reuse_lines else None
+            self.screen_hits[self.scanline] = hit
+
+        self.evaluate_sprites()
+
+        # after cycle 337 the shifters hold the two tiles fetched for the next line, unless they never shifted
+        if shift:
+            pattern_lwrd = next_lsb << 8
+            pattern_hwrd = next_msb << 8
+            attrib_lwrd = 0xFF00 if next_attrib & 0x01 else 0x0000
+            attrib_hwrd = 0xFF00 if next_attrib & 0x02 else 0x0000
+
+        self.bg_shifter_pattern_lwrd = (pattern_lwrd & 0xFF00) | tile_lsb
+        self.bg_shifter_pattern_hwrd = (pattern_hwrd & 0xFF00) | tile_msb
+        self.bg_shifter_attrib_lwrd = (attrib_lwrd & 0xFF00) | (0xFF if tile_attrib & 0x01 else 0x00)
+        self.bg_shifter_attrib_hwrd = (attrib_hwrd & 0xFF00) | (0xFF if tile_attrib & 0x02 else 0x00)
+
+        self.bg_next_tile_id = tile_id
+        self.bg_next_tile_attrib = tile_attrib
+        self.bg_next_tile_lsb = tile_lsb
+        self.bg_next_tile_msb = tile_msb
+
+        self.vram_addr = v
+
+        if render and self.scanline < 240:
+            self.cartridge.mapper.scanline()
+
+    def line_key(self) -> tuple:
+        # everything the pixels of the line about to be fetched depend on, the tiles all come from one row of
+        # the nametable v points at and the one next to it
+        v = self.vram_addr
+        banks = NAMETABLE_BANKS[self.mirror]
+        left = banks[(v >> 10) & 0x03]
+        right = banks[((v >> 10) & 0x03) ^ 0x01]
+        row = (v >> 5) & 0x1F
+
+        return (
+            v, self.fine_x, self.mask, self.control & PATTERN_BACKGROUND, self.bg_next_tile_id,
+            self.bg_shifter_pattern_lwrd, self.bg_shifter_pattern_hwrd, self.bg_shifter_attrib_lwrd, self.bg_shifter_attrib_hwrd,
+            left, right, self.nametable_stamps[left][row], self.nametable_stamps[right][row], self.palette_stamp, self.chr_stamp,
+            None if self.sprite_line is SPRITE_LINE_EMPTY else self.sprite_line.tobytes(),
+        )
+
+    def evaluate_sprites(self):
+        # cycle 257, picks the first 8 sprites in OAM that are on the next line, all at once, and lays them out into
+        # sprite_line, lower OAM entries are in front of higher ones
+        self.sprite_line = SPRITE_LINE_EMPTY
+        self.sprite_zero = False
+
+        if self.scanline < 0 or not (self.mask & (RENDER_BACKGROUND | RENDER_SPRITES)):
+            return # nothing is ever on the first line
+
+        height = 16 if (self.control & SPRITE_SIZE) else 8
+        oam = np.frombuffer(self.oam, dtype=np.uint8).reshape(64, 4).astype(np.int16)
+
+        # OAM y is one less than the first line a sprite is on, so this line - y is the row on the next line
+        rows = self.scanline - oam[:, 0]
+        found = np.flatnonzero((rows >= 0) & (rows < height))
+
+        if len(found) > 8:
+            self.status |= SPRITE_OVERFLOW
+            found = found[:8]
+
+        if not len(found):
+            return
+
+        sprites = oam[found]
+        tile_ids = sprites[:, 1]
+        attribs = sprites[:, 2]
+
+        rows = rows[found]
+        rows = np.where(attribs & SPRITE_FLIP_Y, height - 1 - rows, rows)
+
+        if height == 16:
+            # 8x16 sprites pick their table with bit 0 of the tile id, the bottom half is the next tile
+            tables = tile_ids & 0x01
+            tile_ids = (tile_ids & 0xFE) | (rows >> 3)
+            rows = rows & 0x07
+            pixels = np.where(tables[:, None] != 0, self.pattern_rows(1, tile_ids, rows), self.pattern_rows(0, tile_ids, rows))
+        else:
+            pixels = self.pattern_rows(1 if (self.control & PATTERN_SPRITE) else 0, tile_ids, rows)
+
+        # flipped sprites read their row back to front
+        columns = SPRITE_COLUMNS[(attribs & SPRITE_FLIP_X) >> 6]
+        pixels = pixels[np.arange(len(found))[:, None], columns]
+
+        flags = SPRITE_FLAGS[attribs & (SPRITE_PRIORITY | SPRITE_PALETTE)]
+        if found[0] == 0:
+            flags[0] |= SPRITE_LINE_ZERO
+            self.sprite_zero = True
+
+        # one row per sprite with room for the ones hanging off the right edge, the first opaque one wins
+        layers = np.zeros((len(found), 256 + 8), dtype=np.uint8)
+        layers[np.arange(len(found))[:, None], sprites[:, 3:4] + SPRITE_COLUMNS[0]] = (pixels | flags[:, None]) * (pixels != 0)
+
+        front = (layers[:, :256] != 0).argmax(axis=0)
+        self.sprite_line = layers[front, np.arange(256)]
+
+    def pattern_rows(self, table: int, tile_ids: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        # the 8 pixels of a row of each tile in a pattern table, straight from the decoded tiles when the table has them
+        tiles = self.pattern_tables[table]
+
+        if tiles is not None:
+            self.cartridge.chr_tiles.update()
+            return tiles[tile_ids, rows]
+
+        addrs = ((table << 12) + (tile_ids << 4) + rows).tolist()
+        planes = np.unpackbits(np.array([[self.ppu_read(addr) & 0xFF, self.ppu_read(addr + 8) & 0xFF] for addr in addrs], dtype=np.uint8), axis=1)
+
+        return planes[:, :8] | (planes[:, 8:] << 1)
+
+    def dots_until_status_change(self) -> int:
+        # like dots_until_event but also stopping where sprite zero hit or overflow could get set in PPUSTATUS,
+        # which can happen anywhere on a line that is being rendered
+        dots = self.dots_until_event()
+
+        if self.scanline < 240 and self.mask & (RENDER_BACKGROUND | RENDER_SPRITES):
+            if (self.status & (SPRITE_ZERO_HIT | SPRITE_OVERFLOW)) != (SPRITE_ZERO_HIT | SPRITE_OVERFLOW):
+                dots = min(dots, PPU_DOTS_PER_SCANLINE - self.cycle)
+
+        return dots
+
+    def dots_until_event(self) -> int:
+        # how many dots can be clocked in bulk before the cpu could notice, vblank starting or the frame ending
+        dot = (self.scanline + 1) * PPU_DOTS_PER_SCANLINE + self.cycle
+
+        if dot <= PPU_VBLANK_DOT: # sitting on the vblank dot means it hasn't been clocked yet
+            dots = PPU_VBLANK_DOT - dot + 1
+        else:
+            dots = PPU_DOTS_PER_FRAME - dot
+
+        if self.cartridge.mapper.scanline_irq and self.scanline < 240:
+            # the mapper is told about the scanline on cycle 259 and may raise an interrupt
+            dots = min(dots, (259 - self.cycle) % PPU_DOTS_PER_SCANLINE + 1)
+
+        return dots
+
     def plug_cartridge(self, cart: Cartridge):
         self.cartridge = cart
+        self.chr_slots = cart.mapper.chr_slots
+        self.map_nametables()
+        self.map_pattern_tables()
@@ -2,6 +2,8 @@ from typing import Callable
 
 from nespy.const import *
 from nespy.operations import OPCODE_LOOKUP, IMP
+from nespy.fused import FUSED_LOOKUP
+from nespy.recompiler import Recompiler
 
 class Cmp6502():
     a: int = 0x00 # a register
@@ -9,7 +11,8 @@ class Cmp6502():
     y: int = 0x00 # y register
     pc: int = 0x0000 # program counter
     s: int = 0x00 # stack pointer
-    status: int = 0x00 # status register
+    status: int = 0x00 # status register, Z and N are out of date, see get_status
+    nz: int = 0x01 # last result the Z and N flags are computed from
 
     # these are util used for addressing modes to store the data that they fetch or represent
     addr_abs: int = 0x0000 # address fetched from, set by addressing modes
@@ -18,12 +21,19 @@ class Cmp6502():
 
     # these aren't used for emulation but are used for interface / debugging
     clock_count: int = 0 # how many cycles have passed since reset
+    instruction_clock: int = 0 # clock_count on the first cycle of the instruction running now
 
     # this is used to time instructions, it will be incremented by the cycle count of an instruction
     # when an instruction is run and then will be decremented every clock cycle to zero before
     # the next instruction can be run
     cycles = 0
 
+    # run instructions through the generated per-opcode handlers instead of the lookup table
+    fused: bool = False
+
+    # run PRG ROM through compiled basic blocks when set, only used by step()
+    recompiler: Recompiler = None
+
     def __init__(self, bus):
         self.bus = bus
     
@@ -33,6 +43,13 @@ class Cmp6502():
         
         return self.bus.read(self.addr_abs)
     
+    def get_status(self) -> int:
+        return (self.status & ~(Z | N)) | NZ_FLAGS[self.nz]
+
+    def set_status(self, value: int):
+        self.status = value
+        self.nz = ((value & N) << 1) | (0x00 if value & Z else 0x01)
+
     def set_flag(self, flag: int, val: bool):
         if val:
             self.status |= flag
@@ -41,22 +58,77 @@ class Cmp6502():
     
     def clock(self) -> None:
         if not self.cycles: # preivous instruction done, we're ready for the next instruction
+            self.instruction_clock = self.clock_count
             self.opcode = self.bus.read(self.pc) # read opcode at the program counter pointer
 
             self.status |= U # for some reason this needs to be true
 
             self.pc = (self.pc + 1) & 0xFFFF # increment program counter in bounds
 
-            instruction, addr_mode, cycles = OPCODE_LOOKUP[self.opcode] # look up the instruction from the opcode lookup table
-            self.addr_mode = addr_mode
-            
-            extra_cycle = (addr_mode(self)) & (instruction(self, self.addr_abs))
-            self.cycles += cycles + extra_cycle
+            if self.fused:
+                cycles = FUSED_LOOKUP[self.opcode](self) # before touching cycles, an OAM DMA adds its stall to them
+                self.cycles += cycles
+
+            else:
+                instruction, addr_mode, cycles = OPCODE_LOOKUP[self.opcode] # look up the instruction from the opcode lookup table
+                self.addr_mode = addr_mode
+                
+                extra_cycle = (addr_mode(self)) & (instruction(self, self.addr_abs))
+                self.cycles += cycles + extra_cycle
 
             self.status |= U # for some reason this needs to be true
 
         self.cycles -= 1
         self.clock_count += 1
+
+    def step(self) -> int:
+        """
+        Run a whole instruction at once and return how many cycles it took, used by the catch-up engine
+        """
+        if self.cycles: # pay off cycles owed by a reset, an interrupt or a DMA before the next instruction
+            cycles = self.cycles
+            self.cycles = 0
+            self.clock_count += cycles
+            return cycles
+
+        if self.recompiler is not None and self.pc >= 0x8000:
+            block = self.recompiler.block(self.pc)
+
+            # a block that could run past the ppu's next event would take the interrupts it raises late
+            if block is not None and (self.clock_count + block.cycles) * 3 < self.bus.event_clock_count:
+                start = self.clock_count
+                self.status |= U
+                block(self)
+                self.status |= U
+                return self.clock_count - start
+
+        self.instruction_clock = self.clock_count
+        self.opcode = self.bus.read(self.pc)
+
+        self.status |= U
+
+        self.pc = (self.pc + 1) & 0xFFFF
+
+        instruction, addr_mode, cycles = OPCODE_LOOKUP[self.opcode]
+
+        # charge the cycles up front so any register access during the instruction catches the ppu up to its end
+        self.clock_count += cycles
+
+        if self.fused:
+            extra_cycle = FUSED_LOOKUP[self.opcode](self) - cycles
+
+        else:
+            self.addr_mode = addr_mode
+
+            extra_cycle = (addr_mode(self)) & (instruction(self, self.addr_abs))
+            extra_cycle += self.cycles # branches add their cycles directly
+            self.cycles = 0
+
+        self.clock_count += extra_cycle
+
+        self.status |= U
+
+        return cycles + extra_cycle
     
     def reset(self) -> None:
         """
@@ -70,7 +142,7 @@ class Cmp6502():
         self.x = 0x00
         self.y = 0x00
         self.s = 0xFD
-        self.status = 0x00 | U
+        self.set_status(0x00 | U)
 
         # read FFFC and FFFD, these addresses hold the value for the program counter start
         self.pc = (self.bus.read(0xFFFD) << 8) | self.bus.read(0xFFFC)
@@ -83,7 +155,7 @@ class Cmp6502():
         self.cycles = 8
 
     def interrupt_request(self) -> None:
-        if not (self.status | I): # make sure interrupts aren't disabled
+        if not (self.status & I): # make sure interrupts aren't disabled
             self.bus.write(0x0100 + self.s, (self.pc >> 8) & 0x00FF)
             self.s = (self.s - 1) & 0xFF
             self.bus.write(0x0100 + self.s, self.pc & 0x00FF)
@@ -93,13 +165,13 @@ class Cmp6502():
             self.status |= U
             self.status |= I
 
-            self.bus.write(0x0100 + self.s, self.status)
+            self.bus.write(0x0100 + self.s, self.get_status())
 
             self.s = (self.s - 1) & 0xFF
             self.pc = (self.bus.read(0xFFFF) << 8) | self.bus.read(0xFFFE)
     
             # an interrupt request takes 7 cycles
-            self.cylces = 7
+            self.cycles += 7
     
     def non_maskable_interrupt(self) -> None:
         self.bus.write(0x0100 + self.s, (self.pc >> 8) & 0x00FF)
@@ -111,10 +183,10 @@ class Cmp6502():
         self.status |= U
         self.status |= I
 
-        self.bus.write(0x0100 + self.s, self.status)
+        self.bus.write(0x0100 + self.s, self.get_status())
 
         self.s = (self.s - 1) & 0xFF
         self.pc = (self.bus.read(0xFFFB) << 8) | self.bus.read(0xFFFA)
 
         # an NMI takes 8 cycles
-        self.cylces = 8
+        self.cycles += 8
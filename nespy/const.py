@@ -8,12 +8,21 @@ U = (1 << 5) # unused
 V = (1 << 6) # overflow
 N = (1 << 7) # negative
 
+# Z and N flags for the last result, the cpu only looks them up when the status register is actually read
+# the first 256 entries cover every byte result, bit 8 stands in for N so PLP and RTI can restore Z and N together
+NZ_FLAGS = tuple((0 if i & 0xFF else Z) | (N if i & 0x180 else 0) for i in range(0x200))
+
 # Catridge mirroring modes
 MIRROR_HARDWARE = 1
 MIRROR_HORIZONTAL = 2
 MIRROR_VERTICAL = 3
 MIRROR_ONSCREEN_LO = 4
 MIRROR_ONSCREEN_HI = 5
+MIRROR_FOUR_SCREEN = 6
+
+# Bus scheduling engines
+ENGINE_DOT = 1 # every dot is clocked, the cpu is clocked on every third one
+ENGINE_CATCHUP = 2 # the cpu runs whole instructions and the ppu is caught up in bulk
 
 # PPU status register
 SPRITE_OVERFLOW = (1 << 5)
@@ -40,10 +49,22 @@ SPRITE_SIZE = (1 << 5)
 SLAVE_MODE = (1 << 6)
 ENABLE_NMI = (1 << 7)
 
+# OAM sprite attributes
+SPRITE_PALETTE = 0x03
+SPRITE_PRIORITY = (1 << 5) # behind the background
+SPRITE_FLIP_X = (1 << 6)
+SPRITE_FLIP_Y = (1 << 7)
+
 PAL_COLORS = (5526612, 7796, 528528, 3145864, 4456548, 6029360, 5506048, 3938304, 2107904, 539136, 16384, 15360, 12860, 0, 0, 0, 10000024, 543940, 3158764, 6037220, 8918192, 10490980, 9970208, 7879680, 5528064, 2650624, 556032, 30248, 26232, 0, 0, 0, 15527660, 5020396, 7896300, 11559660, 14963948, 15489204, 15493732, 13928480, 10529280, 7652352, 5034016, 3722348, 3716300, 3947580, 0, 0, 15527660, 11062508, 12369132, 13939436, 15511276, 15511252, 15512752, 14992528, 13423224, 11853432, 11068048, 10019508, 10540772, 10527392, 0, 0)
 
 
 AUDIO_SAMPLE_RATE = 44100
 AUDIO_BLOCK_SIZE = 4410
 
-PPU_CLOCK_FREQ = 5369318
\ No newline at end of file
+PPU_CLOCK_FREQ = 5369318
+CPU_CLOCK_FREQ = 1789773
+
+# PPU frame timing, dots are counted from the start of the pre-render scanline
+PPU_DOTS_PER_SCANLINE = 341
+PPU_DOTS_PER_FRAME = 262 * PPU_DOTS_PER_SCANLINE
+PPU_VBLANK_DOT = 242 * PPU_DOTS_PER_SCANLINE + 1 # scanline 241, cycle 1
\ No newline at end of file
@@ -0,0 +1,394 @@
+from nespy.instructions import *
+from nespy.addr_modes import *
+from nespy.operations import OPCODE_LOOKUP, NUL
+from nespy.const import *
+
+# Fused opcode handlers
+
+# every opcode gets its own handler with the addressing mode, the operand fetch, the flag updates and the cycle
+# count inlined, generated from OPCODE_LOOKUP when this module is imported
+# a handler takes the cpu and returns the number of cycles the instruction took, page crossings and branches included
+
+# addressing modes leave the effective address in addr, and the high byte in hi when a page crossing costs a cycle
+ADDR_MODE_SOURCE = {
+    IMP: "",
+    IMM: """
+addr = cpu.pc
+cpu.pc = addr + 1
+""",
+    ZP0: """
+pc = cpu.pc
+addr = read(pc) & 0xFF
+cpu.pc = pc + 1
+""",
+    ZPX: """
+pc = cpu.pc
+addr = (read(pc) + cpu.x) & 0xFF
+cpu.pc = pc + 1
+""",
+    ZPY: """
+pc = cpu.pc
+addr = (read(pc) + cpu.y) & 0xFF
+cpu.pc = pc + 1
+""",
+    REL: """
+pc = cpu.pc
+rel = read(pc)
+pc += 1
+cpu.pc = pc
+if rel & 0x80:
+    rel |= 0xFF00
+addr = (pc + rel) & 0xFFFF
+""",
+    ABS: """
+pc = cpu.pc
+addr = read(pc) | (read(pc + 1) << 8)
+cpu.pc = pc + 2
+""",
+    ABX: """
+pc = cpu.pc
+lo = read(pc)
+hi = read(pc + 1) << 8
+cpu.pc = pc + 2
+addr = ((hi | lo) + cpu.x) & 0xFFFF
+""",
+    ABY: """
+pc = cpu.pc
+lo = read(pc)
+hi = read(pc + 1) << 8
+cpu.pc = pc + 2
+addr = ((hi | lo) + cpu.y) & 0xFFFF
+""",
+    IND: """
+pc = cpu.pc
+lo = read(pc)
+hi = read(pc + 1)
+cpu.pc = pc + 2
+ptr = (hi << 8) | lo
+if lo == 0xFF:
+    addr = (read(ptr & 0xFF00) << 8) | read(ptr)
+else:
+    addr = (read(ptr + 1) << 8) | read(ptr)
+""",
+    IZX: """
+pc = cpu.pc
+ptr = read(pc)
+cpu.pc = pc + 1
+lo = read((ptr + cpu.x) & 0xFF)
+hi = read((ptr + cpu.x + 1) & 0xFF)
+addr = (hi << 8) | lo
+""",
+    IZY: """
+pc = cpu.pc
+ptr = read(pc)
+cpu.pc = pc + 1
+lo = read(ptr & 0xFF)
+hi = read((ptr + 1) & 0xFF) << 8
+addr = ((hi | lo) + cpu.y) & 0xFFFF
+""",
+    NUL: "",
+}
+
+# instructions read their operand with {fetch} and write read-modify-write results with {store}
+# flags other than Z and N are assembled straight into the status register, Z and N are left to cpu.nz
+INSTRUCTION_SOURCE = {
+    ADC: """
+fetched = {fetch}
+a = cpu.a
+t = a + fetched + (cpu.status & C)
+cpu.status = (cpu.status & ~(C | V)) | (t >> 8) | (((~(a ^ fetched) & (a ^ t)) & 0x80) >> 1)
+t &= 0xFF
+cpu.a = t
+cpu.nz = t
+""",
+    SBC: """
+fetched = {fetch} ^ 0xFF
+a = cpu.a
+t = a + fetched + (cpu.status & C)
+cpu.status = (cpu.status & ~(C | V)) | (t >> 8) | ((((t ^ a) & (t ^ fetched)) & 0x80) >> 1)
+t &= 0xFF
+cpu.a = t
+cpu.nz = t
+""",
+    AND: """
+a = cpu.a & {fetch}
+cpu.a = a
+cpu.nz = a
+""",
+    EOR: """
+a = cpu.a ^ {fetch}
+cpu.a = a
+cpu.nz = a
+""",
+    ORA: """
+a = cpu.a | {fetch}
+cpu.a = a
+cpu.nz = a
+""",
+    ASL: """
+t = {fetch} << 1
+cpu.status = (cpu.status & ~C) | (t >> 8)
+t &= 0xFF
+cpu.nz = t
+{store}
+""",
+    LSR: """
+fetched = {fetch}
+t = fetched >> 1
+cpu.status = (cpu.status & ~C) | (fetched & 0x01)
+cpu.nz = t
+{store}
+""",
+    ROL: """
+fetched = {fetch}
+t = ((cpu.status & C) | (fetched << 1)) & 0xFF
+cpu.status = (cpu.status & ~C) | (fetched >> 7)
+cpu.nz = t
+{store}
+""",
+    ROR: """
+fetched = {fetch}
+t = ((cpu.status & C) << 7) | (fetched >> 1)
+cpu.status = (cpu.status & ~C) | (fetched & 0x01)
+cpu.nz = t
+{store}
+""",
+    BRK: """
+pc = (cpu.pc + 1) & 0xFFFF
+read(pc)
+cpu.status |= I
+s = cpu.s
+write(0x0100 + s, (pc >> 8) & 0xFF)
+write(0x0100 + s - 1, pc & 0xFF)
+write(0x0100 + s - 2, (cpu.status & ~(Z | N)) | NZ_FLAGS[cpu.nz] | (B | U))
+cpu.s = (s - 3) & 0xFF
+cpu.status &= ~B
+cpu.pc = (read(0xFFFF) << 8) | read(0xFFFE)
+""",
+    CLC: "cpu.status &= ~C",
+    CLD: "cpu.status &= ~D",
+    CLI: "cpu.status &= ~I",
+    CLV: "cpu.status &= ~V",
+    SEC: "cpu.status |= C",
+    SED: "cpu.status |= D",
+    SEI: "cpu.status |= I",
+    CMP: """
+fetched = {fetch}
+t = cpu.a - fetched
+cpu.status = (cpu.status & ~C) | (t >= 0)
+cpu.nz = t & 0xFF
+""",
+    CPX: """
+fetched = {fetch}
+t = cpu.x - fetched
+cpu.status = (cpu.status & ~C) | (t >= 0)
+cpu.nz = t & 0xFF
+""",
+    CPY: """
+fetched = {fetch}
+t = cpu.y - fetched
+cpu.status = (cpu.status & ~C) | (t >= 0)
+cpu.nz = t & 0xFF
+""",
+    DEC: """
+t = ({fetch} - 1) & 0xFF
+cpu.nz = t
+write(addr, t)
+""",
+    INC: """
+t = ({fetch} + 1) & 0xFF
+cpu.nz = t
+write(addr, t)
+""",
+    DEX: """
+t = (cpu.x - 1) & 0xFF
+cpu.x = t
+cpu.nz = t
+""",
+    DEY: """
+t = (cpu.y - 1) & 0xFF
+cpu.y = t
+cpu.nz = t
+""",
+    INX: """
+t = (cpu.x + 1) & 0xFF
+cpu.x = t
+cpu.nz = t
+""",
+    INY: """
+t = (cpu.y + 1) & 0xFF
+cpu.y = t
+cpu.nz = t
+""",
+    JMP: "cpu.pc = addr",
+    JSR: """
+t = (cpu.pc - 1) & 0xFFFF
+s = cpu.s
+write(0x0100 + s, (t >> 8) & 0xFF)
+write(0x0100 + s - 1, t & 0xFF)
+cpu.s = (s - 2) & 0xFF
+cpu.pc = addr
+""",
+    LDA: """
+t = {fetch}
+cpu.a = t
+cpu.nz = t
+""",
+    LDX: """
+t = {fetch}
+cpu.x = t
+cpu.nz = t
+""",
+    LDY: """
+t = {fetch}
+cpu.y = t
+cpu.nz = t
+""",
+    NOP: "",
+    PHA: """
+write(0x0100 + cpu.s, cpu.a)
+cpu.s = (cpu.s - 1) & 0xFF
+""",
+    PHP: """
+write(0x0100 + cpu.s, (cpu.status & ~(Z | N)) | NZ_FLAGS[cpu.nz] | (B | U))
+cpu.status &= ~(B | U)
+cpu.s = (cpu.s - 1) & 0xFF
+""",
+    PLA: """
+s = (cpu.s + 1) & 0xFF
+cpu.s = s
+t = read(0x0100 + s)
+cpu.a = t
+cpu.nz = t
+""",
+    PLP: """
+s = (cpu.s + 1) & 0xFF
+cpu.s = s
+t = read(0x0100 + s) | U
+cpu.status = t
+cpu.nz = ((t & N) << 1) | (0x00 if t & Z else 0x01)
+""",
+    RTI: """
+read(cpu.pc)
+s = (cpu.s + 1) & 0xFF
+t = read(0x0100 + s) & ~(B | U)
+cpu.status = t
+cpu.nz = ((t & N) << 1) | (0x00 if t & Z else 0x01)
+cpu.pc = read(0x0100 + s + 1) | (read(0x0100 + s + 2) << 8)
+cpu.s = (s + 2) & 0xFF
+""",
+    RTS: """
+read(cpu.pc)
+s = cpu.s
+cpu.pc = ((read(0x0100 + s + 1) | (read(0x0100 + s + 2) << 8)) + 1) & 0xFFFF
+cpu.s = (s + 2) & 0xFF
+""",
+    STA: "write(addr, cpu.a)",
+    STX: "write(addr, cpu.x)",
+    STY: "write(addr, cpu.y)",
+    TAX: """
+t = cpu.a
+cpu.x = t
+cpu.nz = t
+""",
+    TXA: """
+t = cpu.x
+cpu.a = t
+cpu.nz = t
+""",
+    TAY: """
+t = cpu.a
+cpu.y = t
+cpu.nz = t
+""",
+    TYA: """
+t = cpu.y
+cpu.a = t
+cpu.nz = t
+""",
+    TSX: """
+t = cpu.s
+cpu.x = t
+cpu.nz = t
+""",
+    TXS: "cpu.s = cpu.x",
+    BIT: """
+fetched = {fetch}
+cpu.status = (cpu.status & ~V) | (fetched & V)
+cpu.nz = ((fetched & 0x80) | 0x01) if cpu.a & fetched else ((fetched & 0x80) << 1)
+""",
+    NUL: "",
+}
+
+# branches are taken on a condition, costing an extra cycle and another one if they land on a different page
+BRANCH_CONDITIONS = {
+    BCC: "not (cpu.status & C)",
+    BCS: "cpu.status & C",
+    BEQ: "not (cpu.nz & 0xFF)",
+    BNE: "cpu.nz & 0xFF",
+    BVC: "not (cpu.status & V)",
+    BVS: "cpu.status & V",
+    BPL: "not (cpu.nz & 0x180)",
+    BMI: "cpu.nz & 0x180",
+}
+
+# instructions that spend an extra cycle when their addressing mode crosses a page
+PAGE_CROSS_INSTRUCTIONS = (ADC, SBC, AND, CMP, EOR, ORA, LDA, LDX, LDY)
+
+def instruction_lines(opcode: int) -> tuple:
+    """
+    Build the inlined source lines for an opcode, returns (lines, cycles) where cycles is an expression
+    """
+    instruction, addr_mode, cycles = OPCODE_LOOKUP[opcode]
+
+    lines = ADDR_MODE_SOURCE[addr_mode].strip().splitlines()
+
+    if instruction in BRANCH_CONDITIONS:
+        lines += [
+            f"if {BRANCH_CONDITIONS[instruction]}:",
+            f"    cpu.pc = addr",
+            f"    return {cycles + 1} + ((addr & 0xFF00) != (pc & 0xFF00))",
+        ]
+        return (lines, str(cycles))
+
+    body = INSTRUCTION_SOURCE[instruction].strip().format(
+        fetch="cpu.a" if addr_mode is IMP else "read(addr)",
+        store="cpu.a = t" if addr_mode is IMP else "write(addr, t)",
+    )
+    lines += body.splitlines()
+
+    if addr_mode in (ABX, ABY, IZY) and (instruction in PAGE_CROSS_INSTRUCTIONS or (instruction is NOP and addr_mode is ABX)):
+        return (lines, f"{cycles} + ((addr & 0xFF00) != hi)")
+
+    return (lines, str(cycles))
+
+def handler_source(opcode: int) -> str:
+    lines, cycles = instruction_lines(opcode)
+    source = [f"def OP_{opcode:02X}(cpu):"]
+
+    body = "\n".join(lines)
+
+    if "read(" in body:
+        source.append("    read = cpu.bus.read")
+    if "write(" in body:
+        source.append("    write = cpu.bus.write")
+
+    source += ["    " + line for line in lines]
+    source.append(f"    return {cycles}")
+
+    return "\n".join(source)
+
+def fused_source() -> str:
+    """
+    Generate the source of all 256 handlers, handy for reading or caching what gets compiled
+    """
+    return "\n\n".join(handler_source(opcode) for opcode in range(256)) + "\n"
+
+def build_fused_lookup() -> tuple:
+    namespace = {"C": C, "Z": Z, "I": I, "D": D, "B": B, "U": U, "V": V, "N": N, "NZ_FLAGS": NZ_FLAGS}
+    exec(compile(fused_source(), "<nespy fused opcodes>", "exec"), namespace)
+
+    return tuple(namespace[f"OP_{opcode:02X}"] for opcode in range(256))
+
+# drop in replacement for OPCODE_LOOKUP, indexed by opcode
+FUSED_LOOKUP = build_fused_lookup()
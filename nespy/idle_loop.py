@@ -0,0 +1,90 @@
+from nespy.instructions import *
+from nespy.addr_modes import *
+from nespy.operations import OPCODE_LOOKUP
+from nespy.fused import BRANCH_CONDITIONS
+
+# Idle loop detection
+
+# games wait for vblank or an NMI by spinning on a handful of instructions that only read ram or PPUSTATUS, like
+# LDA $2002 / BPL or LDA flag / BEQ or JMP *
+# once an iteration of such a loop ends with the cpu in the exact same state it started in, every following iteration
+# is going to do the same thing until the ppu raises something, so the catch-up engine can jump straight there
+
+IDLE_LOOP_MAX_INSTRUCTIONS = 8
+
+# instructions that can't change anything but the registers and flags
+IDLE_INSTRUCTIONS = (LDA, LDX, LDY, BIT, CMP, CPX, CPY, AND, ORA, EOR, NOP)
+
+def idle_read(addr: int) -> bool:
+    # ram and PPUSTATUS are the only things a loop can read over and over without side effects,
+    # reading PPUSTATUS twice is the same as reading it once until the ppu sets vblank again
+    return addr < 0x2000 or (addr < 0x4000 and addr & 0x0007 == 0x0002)
+
+def loop_cycles(read, head: int, start: int) -> tuple:
+    """
+    Check the loop that just jumped back to head from a step that started at start, the jump back is the first branch
+    or jump at or after start, returns how many cycles an iteration that falls through every other branch takes
+    or 0 if it isn't an idle loop, and whether it reads PPUSTATUS
+    """
+    pc = head
+    cycles = 0
+    exits = []
+    polls = False
+
+    for i in range(IDLE_LOOP_MAX_INSTRUCTIONS):
+        instruction, addr_mode, base_cycles = OPCODE_LOOKUP[read(pc)]
+        next_pc = pc + 1
+
+        if addr_mode in (IMM, ZP0, REL):
+            operand = read(next_pc)
+            next_pc += 1
+        elif addr_mode is ABS:
+            operand = read(next_pc) | (read(next_pc + 1) << 8)
+            next_pc += 2
+        elif addr_mode is IMP and instruction is NOP:
+            operand = None
+        else:
+            return 0, False # anything indexed or indirect can read somewhere different each time
+
+        if instruction in BRANCH_CONDITIONS:
+            target = (next_pc + (operand - 0x100 if operand & 0x80 else operand)) & 0xFFFF
+
+            if pc >= start:
+                if target != head:
+                    return 0, False
+
+                cycles += base_cycles + 1 + ((target & 0xFF00) != (next_pc & 0xFF00))
+                break
+
+            exits.append(target)
+            cycles += base_cycles
+
+        elif instruction is JMP:
+            if pc < start or operand != head:
+                return 0, False
+
+            cycles += base_cycles
+            break
+
+        elif instruction in IDLE_INSTRUCTIONS:
+            if addr_mode in (ZP0, ABS):
+                if not idle_read(operand):
+                    return 0, False
+
+                polls = polls or operand >= 0x2000
+
+            cycles += base_cycles
+
+        else:
+            return 0, False
+
+        pc = next_pc
+
+    else:
+        return 0, False
+
+    for target in exits:
+        if head <= target <= pc:
+            return 0, False # a branch inside the loop would make iterations take different paths
+
+    return cycles, polls
@@ -13,11 +13,10 @@ def ADC(cpu: Cmp6502, addr_abs) -> int:
     t = cpu.a + fetched + bool(cpu.status & C)
 
     cpu.set_flag(C, t > 0xFF) # set carry bit since result is greater than 0xFF
-    cpu.set_flag(Z, not (t & 0xFF)) # set zero bit if the actual resulting value is 0 (regardless of carry)
     cpu.set_flag(V, (~(cpu.a ^ fetched) & (cpu.a ^ t)) & 0x80) # wacky logic for signed carry bit
-    cpu.set_flag(N, t & 0x80)
 
     cpu.a = t & 0xFF
+    cpu.nz = cpu.a # zero and negative flags come from the result
 
     return 1
 
@@ -27,18 +26,16 @@ def SBC(cpu: Cmp6502, addr_abs) -> int:
     t = cpu.a + (fetched ^ 0xFF) + bool(cpu.status & C) # fetched is inverted using xor
 
     cpu.set_flag(C, t & 0xFF00) # set carry bit since result is greater than 0xFF
-    cpu.set_flag(Z, not (t & 0xFF)) # set zero bit if the actual resulting value is 0 (regardless of carry)
     cpu.set_flag(V, ((t ^ cpu.a) & (t ^ (fetched ^ 0xFF))) & 0x80) # wacky logic for signed carry bit
-    cpu.set_flag(N, t & 0x80)
 
     cpu.a = t & 0xFF
+    cpu.nz = cpu.a # zero and negative flags come from the result
 
     return 1
 
 def AND(cpu: Cmp6502, addr_abs) -> int:    
     cpu.a &= cpu.fetch()
-    cpu.set_flag(Z, not cpu.a)
-    cpu.set_flag(N, cpu.a & 0x80)
+    cpu.nz = cpu.a
 
     return 1
 
@@ -46,11 +43,10 @@ def ASL(cpu: Cmp6502, addr_abs) -> int:
     t = (cpu.fetch() << 1)
 
     cpu.set_flag(C, t & 0xFF00)
-    cpu.set_flag(Z, not (t & 0xFF))
-    cpu.set_flag(N, t & 0x80)
+    cpu.nz = t & 0xFF
 
     if cpu.addr_mode is IMP:
-        cpu.a = t
+        cpu.a = t & 0xFF
     else:
         cpu.bus.write(cpu.addr_abs, t)
     
@@ -63,7 +59,7 @@ def BRK(cpu: Cmp6502, addr_abs) -> int: # program sourced interrupt
     cpu.status |= I
     cpu.bus.write(0x0100 + cpu.s, (cpu.pc >> 8) & 0xFF)
     cpu.bus.write(0x0100 + cpu.s - 1, cpu.pc & 0xFF)
-    cpu.bus.write(0x0100 + cpu.s - 2, cpu.status | (B | U))
+    cpu.bus.write(0x0100 + cpu.s - 2, cpu.get_status() | (B | U))
 
     cpu.s = (cpu.s - 3) & 0xFF
 
@@ -105,9 +101,8 @@ def CMP(cpu: Cmp6502, addr_abs) -> int:
     fetched = cpu.fetch()
     
     t = cpu.a - fetched
-    cpu.set_flag(Z, not (t & 0xFF))
     cpu.set_flag(C, cpu.a >= fetched)
-    cpu.set_flag(N, t & 0x80) 
+    cpu.nz = t & 0xFF
     
     return 1
 
@@ -115,9 +110,8 @@ def CPX(cpu: Cmp6502, addr_abs) -> int:
     fetched = cpu.fetch()
     
     t = cpu.x - fetched
-    cpu.set_flag(Z, not t)
     cpu.set_flag(C, cpu.x >= fetched)
-    cpu.set_flag(N, t & 0x80) 
+    cpu.nz = t & 0xFF
     
     return 0
 
@@ -125,67 +119,58 @@ def CPY(cpu: Cmp6502, addr_abs) -> int:
     fetched = cpu.fetch()
     
     t = cpu.y - fetched
-    cpu.set_flag(Z, not t)
     cpu.set_flag(C, cpu.y >= fetched)
-    cpu.set_flag(N, t & 0x80) 
+    cpu.nz = t & 0xFF
     
     return 0
 
 def DEC(cpu: Cmp6502, addr_abs) -> int:
-    t = cpu.fetch() - 1
-    cpu.set_flag(Z, not t)
-    cpu.set_flag(N, t & 0x80)
+    t = (cpu.fetch() - 1) & 0xFF
+    cpu.nz = t
     cpu.bus.write(cpu.addr_abs, t)
 
     return 0
 
 def DEX(cpu: Cmp6502, addr_abs) -> int:
     cpu.x = (cpu.x - 1) & 0xFF
-    cpu.set_flag(Z, not cpu.x)
-    cpu.set_flag(N, cpu.x & 0x80)
+    cpu.nz = cpu.x
 
     return 0
 
 def DEY(cpu: Cmp6502, addr_abs) -> int:
     cpu.y = (cpu.y - 1) & 0xFF
-    cpu.set_flag(Z, not cpu.y)
-    cpu.set_flag(N, cpu.y & 0x80)
+    cpu.nz = cpu.y
 
     return 0
 
 def EOR(cpu: Cmp6502, addr_abs) -> int:
     cpu.a ^= cpu.fetch()
-    cpu.set_flag(Z, not cpu.a)
-    cpu.set_flag(N, cpu.a & 0x80)
+    cpu.nz = cpu.a
 
     return 1
 
 def ORA(cpu: Cmp6502, addr_abs) -> int:
     cpu.a |= cpu.fetch()
-    cpu.set_flag(Z, not cpu.a)
-    cpu.set_flag(N, cpu.a & 0x80)
+    cpu.nz = cpu.a
 
     return 1
 
 def INC(cpu: Cmp6502, addr_abs) -> int:
     t = (cpu.fetch() + 1) & 0xFF
-    cpu.set_flag(Z, not t)
-    cpu.set_flag(N, t & 0x80)
+    cpu.nz = t
     cpu.bus.write(cpu.addr_abs, t)
 
     return 0
 
 def INX(cpu: Cmp6502, addr_abs) -> int:
     cpu.x = (cpu.x + 1) & 0xFF
-    cpu.set_flag(Z, not cpu.x)
-    cpu.set_flag(N, cpu.x & 0x80)
+    cpu.nz = cpu.x
 
     return 0
 
 def INY(cpu: Cmp6502, addr_abs) -> int:
     cpu.y = (cpu.y + 1) & 0xFF
-    cpu.set_flag(Z, not cpu.y)
-    cpu.set_flag(N, cpu.y & 0x80)
+    cpu.nz = cpu.y
     
     return 0
 
@@ -207,22 +192,19 @@ def JSR(cpu: Cmp6502, addr_abs) -> int:
 
 def LDA(cpu: Cmp6502, addr_abs) -> int:
     cpu.a = cpu.fetch()
-    cpu.set_flag(Z, not cpu.a)
-    cpu.set_flag(N, cpu.a & 0x80)
+    cpu.nz = cpu.a
 
     return 1
 
 def LDX(cpu: Cmp6502, addr_abs) -> int:
     cpu.x = cpu.fetch()
-    cpu.set_flag(Z, not cpu.x)
-    cpu.set_flag(N, cpu.x & 0x80)
+    cpu.nz = cpu.x
 
     return 1
 
 def LDY(cpu: Cmp6502, addr_abs) -> int:
     cpu.y = cpu.fetch()
-    cpu.set_flag(Z, not cpu.y)
-    cpu.set_flag(N, cpu.y & 0x80)
+    cpu.nz = cpu.y
 
     return 1
 
@@ -240,7 +222,7 @@ def PHA(cpu: Cmp6502, addr_abs) -> int: #pushes the content of the Accumulator o
     return 0
 
 def PHP(cpu: Cmp6502, addr_abs) -> int: 
-    cpu.bus.write(0x0100 + cpu.s, cpu.status | (B|U))
+    cpu.bus.write(0x0100 + cpu.s, cpu.get_status() | (B|U))
     cpu.status &= ~(B|U)
     cpu.s = (cpu.s - 1) & 0xFF
 
@@ -249,15 +231,13 @@ def PHP(cpu: Cmp6502, addr_abs) -> int:
 def PLA(cpu: Cmp6502, addr_abs) -> int:
     cpu.s = (cpu.s + 1) & 0xFF
     cpu.a = cpu.bus.read(0x0100 + cpu.s)
-    cpu.set_flag(Z, not cpu.a)
-    cpu.set_flag(N, cpu.a & 0x80)
+    cpu.nz = cpu.a
 
     return 0
 
 def PLP(cpu: Cmp6502, addr_abs) -> int:
     cpu.s = (cpu.s + 1) & 0xFF
-    cpu.status = cpu.bus.read(0x100 + cpu.s)
-    cpu.status |= U
+    cpu.set_status(cpu.bus.read(0x100 + cpu.s) | U)
 
     return 0
 
@@ -265,8 +245,7 @@ def RTI(cpu: Cmp6502, addr_abs) -> None:
     cpu.bus.read(cpu.pc) # dummy fetch
 
     cpu.s = (cpu.s + 1) & 0xFF
-    cpu.status = cpu.bus.read(0x0100 + cpu.s)
-    cpu.status &= ~(B|U)
+    cpu.set_status(cpu.bus.read(0x0100 + cpu.s) & ~(B|U))
 
     cpu.pc = cpu.bus.read(0x0100 + cpu.s + 1) | (cpu.bus.read(0x0100 + cpu.s + 2) << 8)
     cpu.s = (cpu.s + 2) & 0xFF
@@ -296,39 +275,34 @@ def STY(cpu: Cmp6502, addr_abs) -> None:
 def TAX(cpu: Cmp6502, addr_abs) -> int:
     #transfers accumulator's value to X
     cpu.x = cpu.a
-    cpu.set_flag(Z, not cpu.x)
-    cpu.set_flag(N, cpu.x & 0x80)    
+    cpu.nz = cpu.x
 
     return 0
 
 def TXA(cpu: Cmp6502, addr_abs) -> int:
     #transers X to A
     cpu.a = cpu.x
-    cpu.set_flag(Z, not cpu.a)
-    cpu.set_flag(N, cpu.a & 0x80)    
+    cpu.nz = cpu.a
 
     return 0
 
 def TAY(cpu: Cmp6502, addr_abs) -> int:
     #transers accumulator's value to Y
     cpu.y = cpu.a
-    cpu.set_flag(Z, not cpu.y)
-    cpu.set_flag(N, cpu.y & 0x80)    
+    cpu.nz = cpu.y
 
     return 0
 
 def TYA(cpu: Cmp6502, addr_abs) -> int:
     #transers Y to A
     cpu.a = cpu.y
-    cpu.set_flag(Z, not cpu.a)
-    cpu.set_flag(N, cpu.a & 0x80)    
+    cpu.nz = cpu.a
 
     return 0
 
 def TSX(cpu: Cmp6502, addr_abs) -> int:
     cpu.x = cpu.s
-    cpu.set_flag(Z, not cpu.x)
-    cpu.set_flag(N, cpu.x & 0x80)    
+    cpu.nz = cpu.x
 
     return 0
 
@@ -340,9 +314,8 @@ def ROL(cpu: Cmp6502, addr_abs) -> int: #moves accumator left a bit
     fetched = cpu.fetch()
     
     t = (bool(cpu.status & C) | (fetched << 1)) & 0xFF
-    cpu.set_flag(N, t & 0x80)
-    cpu.set_flag(Z, not t)
     cpu.set_flag(C, fetched & 0x80)
+    cpu.nz = t
 
     if cpu.addr_mode is IMP:
         cpu.a = t
@@ -357,8 +330,7 @@ def ROR(cpu: Cmp6502, addr_abs) -> int:
     t = (bool(cpu.status & C) << 7) | (fetched >> 1)
 
     cpu.set_flag(C, fetched & 0x01)
-    cpu.set_flag(Z, not t)
-    cpu.set_flag(N, t & 0x80)
+    cpu.nz = t
 
     if cpu.addr_mode is IMP:
         cpu.a = t
@@ -372,9 +344,8 @@ def LSR(cpu: Cmp6502, addr_abs) -> int:
     
     t = fetched >> 1
     
-    cpu.set_flag(N, t & 0x80)
-    cpu.set_flag(Z, not t)
     cpu.set_flag(C, fetched & 0x01)
+    cpu.nz = t
 
     if cpu.addr_mode is IMP:
         cpu.a = t
@@ -387,9 +358,12 @@ def LSR(cpu: Cmp6502, addr_abs) -> int:
 def BIT(cpu: Cmp6502, addr_abs) -> int:
     fetched = cpu.fetch()
     
-    t = cpu.a & fetched
-    cpu.set_flag(Z, not t)
-    cpu.set_flag(N, fetched & 0x80) #bit 7  
+    # zero comes from the and but negative from bit 7 of memory, bit 8 of nz carries N when the and is zero
+    if cpu.a & fetched:
+        cpu.nz = (fetched & 0x80) | 0x01
+    else:
+        cpu.nz = (fetched & 0x80) << 1
+    
     cpu.set_flag(V, fetched & 0x40) #bit 6
 
     return 0
@@ -411,7 +385,7 @@ def BCS(cpu: Cmp6502, addr_abs) -> int:
 
 
 def BEQ(cpu: Cmp6502, addr_abs) -> int:
-    if cpu.status & Z: 
+    if not (cpu.nz & 0xFF): 
         cpu.cycles += 1 + ((cpu.addr_abs & 0xFF00) != (cpu.pc & 0xFF00))
         cpu.pc = cpu.addr_abs
     
@@ -419,7 +393,7 @@ def BEQ(cpu: Cmp6502, addr_abs) -> int:
 
 
 def BNE(cpu: Cmp6502, addr_abs) -> int:
-    if not (cpu.status & Z): 
+    if cpu.nz & 0xFF: 
         cpu.cycles += 1 + ((cpu.addr_abs & 0xFF00) != (cpu.pc & 0xFF00))
         cpu.pc = cpu.addr_abs
     
@@ -443,7 +417,7 @@ def BVS(cpu: Cmp6502, addr_abs) -> int:
 
 
 def BPL(cpu: Cmp6502, addr_abs) -> int:
-    if not (cpu.status & N): 
+    if not (cpu.nz & 0x180): 
         cpu.cycles += 1 + ((cpu.addr_abs & 0xFF00) != (cpu.pc & 0xFF00))
         cpu.pc = cpu.addr_abs
     
@@ -451,7 +425,7 @@ def BPL(cpu: Cmp6502, addr_abs) -> int:
 
 
 def BMI(cpu: Cmp6502, addr_abs) -> int:
-    if cpu.status & N: 
+    if cpu.nz & 0x180: 
         cpu.cycles += 1 + ((cpu.addr_abs & 0xFF00) != (cpu.pc & 0xFF00))
         cpu.pc = cpu.addr_abs
     
@@ -2,21 +2,82 @@ from typing import Tuple
 
 from nespy.const import *
 
+# Bank slots
+
+# instead of mapping every access, a mapper publishes where each window of the address spaces points as a
+# (memory, offset) slot, 8K windows for the cpu and 1K windows for the ppu, and only updates them when its bank
+# registers change, the cartridge, bus and ppu index the memory straight through the slot
+# a slot of None means the window has to go through the map_* methods, which is also all a mapper has to implement,
+# the default update_slots works the slots out from them
+
+PRG_SLOT_SIZE = 0x2000
+CHR_SLOT_SIZE = 0x0400
+
 class Mapper():
     prg_banks: int = 0
     chr_banks: int = 0
 
+    scanline_irq: bool = False # set if the mapper can raise interrupts from scanline()
+
+    bank_epoch: int = 0 # bumped whenever the bank registers change so caches know to look again
+
+    prg_memory: bytearray = None # the cartridge memory the slots point into, set by attach
+    chr_memory: bytearray = None
+
+    prg_slots: list = None # (memory, offset) behind each 8K window of the cpu address space
+    chr_slots: list = None # (memory, offset) behind each 1K window of the pattern tables
+    chr_writable: bool = False # the chr slots can be written through, CHR RAM
+
     def __init__(self, prg_banks: int, chr_banks: int):
         self.prg_banks = prg_banks
         self.chr_banks = chr_banks
+        self.prg_slots = [None] * 8
+        self.chr_slots = [None] * 8
         self.reset()
 
+    def attach(self, prg_memory: bytearray, chr_memory: bytearray):
+        self.prg_memory = prg_memory
+        self.chr_memory = chr_memory
+        self.update_slots()
+
+    def banks_changed(self):
+        # call whenever a bank register changes
+        self.bank_epoch += 1
+        self.update_slots()
+
+    def update_slots(self):
+        # the slow way, a window gets a slot if the map_* methods put it in one straight run of memory
+        if self.prg_memory is None:
+            return
+
+        for window in range(3, 8):
+            first = self.map_cpu_read(window * PRG_SLOT_SIZE)
+            last = self.map_cpu_read(window * PRG_SLOT_SIZE + PRG_SLOT_SIZE - 1)
+
+            if first is None or last is None or first[0] == 0xFFFFFFFF or last[0] - first[0] != PRG_SLOT_SIZE - 1:
+                self.prg_slots[window] = None
+            else:
+                self.prg_slots[window] = (self.prg_memory, first[0])
+
+        for window in range(8):
+            first = self.map_ppu_read(window * CHR_SLOT_SIZE)
+            last = self.map_ppu_read(window * CHR_SLOT_SIZE + CHR_SLOT_SIZE - 1)
+
+            if first is None or last is None or last - first != CHR_SLOT_SIZE - 1:
+                self.chr_slots[window] = None
+            else:
+                self.chr_slots[window] = (self.chr_memory, first)
+
     def map_cpu_read(self, addr: int) -> Tuple[int, int]: # (addr, value)
         pass
 
     def map_cpu_write(self, addr: int, value: int) -> int: # addr
         pass
 
+    def map_cpu_memory(self, addr: int) -> Tuple[bytearray, int]: # (memory, offset)
+        # memory the mapper owns that addr can be read and written straight from, without side effects
+        return None
+
     def map_ppu_read(self, addr: int) -> int: # addr
         pass
 
@@ -26,6 +87,21 @@ class Mapper():
     def reset(self):
         pass
 
+    def prg_bank_key(self) -> tuple:
+        # where each 8K window of PRG ROM currently points, identifies a bank configuration
+        return tuple(self.prg_window_offset(window) for window in range(4, 8))
+
+    def prg_window_offset(self, window: int) -> int:
+        # offset into PRG memory the 8K window starts at, None if the mapper doesn't map it
+        slot = self.prg_slots[window]
+
+        if slot is not None:
+            return slot[1]
+
+        mapped = self.map_cpu_read(window * PRG_SLOT_SIZE)
+
+        return mapped[0] if mapped is not None else None
+
     def mirror_mode(self) -> int:
         return MIRROR_HARDWARE
 
@@ -28,3 +28,16 @@ class Mapper0(Mapper):
                 return addr
         
         return None
+
+    def update_slots(self):
+        if self.prg_memory is None:
+            return
+
+        # a single 16K bank shows up twice
+        for window in range(4, 8):
+            self.prg_slots[window] = (self.prg_memory, ((window - 4) * PRG_SLOT_SIZE) % len(self.prg_memory))
+
+        for window in range(8):
+            self.chr_slots[window] = (self.chr_memory, window * CHR_SLOT_SIZE)
+
+        self.chr_writable = self.chr_banks == 0
@@ -16,7 +16,7 @@ class Mapper1(Mapper):
     load_register_count: int = 0
     control_register: int = 0x00
 
-    ram_static: list = None
+    ram_static: bytearray = None
 
     mirroring: int = MIRROR_HORIZONTAL
     
@@ -25,7 +25,7 @@ class Mapper1(Mapper):
     def __init__(self, prg_banks: int, chr_banks: int):
         super().__init__(prg_banks, chr_banks)
 
-        self.ram_static = [0x00 for i in range(0x8000)]
+        self.ram_static = bytearray(0x8000)
 
     def map_cpu_read(self, addr: int) -> Tuple[int, int]: # (addr, value)
         value = 0x00
@@ -49,6 +49,12 @@ class Mapper1(Mapper):
         
         return None
 
+    def map_cpu_memory(self, addr: int) -> Tuple[bytearray, int]: # (memory, offset)
+        if 0x6000 <= addr <= 0x7FFF:
+            return (self.ram_static, addr & 0x1FFF)
+
+        return None
+
     def map_cpu_write(self, addr: int, value: int) -> int: # addr
         if 0x6000 <= addr <= 0x7FFF:
             self.ram_static[addr & 0x1FFF] = value
@@ -60,6 +66,7 @@ class Mapper1(Mapper):
                 self.load_register = 0x00
                 self.load_register_count = 0x00
                 self.control_register |= 0x0C
+                self.banks_changed()
             
             else:
                 # load value into left of load register
@@ -104,6 +111,7 @@ class Mapper1(Mapper):
                 
                     self.load_register = 0x00
                     self.load_register_count = 0
+                    self.banks_changed()
         
         return None
 
@@ -116,14 +124,14 @@ class Mapper1(Mapper):
                 if self.control_register & 0x10:
                     # 4K CHR Bank Mode    
                     if addr <= 0x0FFF:
-                        return (self.chr_bank_select_lnib * 0x1000 + (addr & 0x0FFF)) & 0xFFFF
+                        return (self.chr_bank_select_lnib * 0x1000 + (addr & 0x0FFF)) % len(self.chr_memory)
                     
                     elif 0x1000 <= addr <= 0x1FFF:
-                        return (self.chr_bank_select_hnib * 0x1000 + (addr & 0x0FFF)) & 0xFFFF
+                        return (self.chr_bank_select_hnib * 0x1000 + (addr & 0x0FFF)) % len(self.chr_memory)
                     
                 else:
                     # 8K CHR Bank Mode
-                    return (self.chr_bank_select * 0x2000 + (addr & 0x1FFF)) & 0xFFFF
+                    return (self.chr_bank_select * 0x2000 + (addr & 0x1FFF)) % len(self.chr_memory)
         
         return None
 
@@ -131,11 +139,42 @@ class Mapper1(Mapper):
         if addr <= 0x1FFF:
             if self.chr_banks == 0:
                 return addr
-            
-            return 0x00
         
         return None
 
+    def update_slots(self):
+        if self.prg_memory is None:
+            return
+
+        if self.control_register & 0x8:
+            # 16K mode
+            lo = self.prg_bank_select_lwrd * 0x4000
+            hi = self.prg_bank_select_hwrd * 0x4000
+        else:
+            # 32K mode
+            lo = self.prg_bank_select * 0x8000
+            hi = lo + 0x4000
+
+        self.prg_slots[3] = (self.ram_static, 0)
+
+        for window, offset in zip(range(4, 8), (lo, lo + 0x2000, hi, hi + 0x2000)):
+            self.prg_slots[window] = (self.prg_memory, offset % len(self.prg_memory))
+
+        if self.chr_banks == 0:
+            banks = (0x0000, 0x1000)
+        elif self.control_register & 0x10:
+            # 4K CHR Bank Mode
+            banks = (self.chr_bank_select_lnib * 0x1000, self.chr_bank_select_hnib * 0x1000)
+        else:
+            # 8K CHR Bank Mode
+            banks = (self.chr_bank_select * 0x2000, self.chr_bank_select * 0x2000 + 0x1000)
+
+        for window in range(8):
+            offset = banks[window >> 2] + (window & 0x03) * CHR_SLOT_SIZE
+            self.chr_slots[window] = (self.chr_memory, offset % len(self.chr_memory))
+
+        self.chr_writable = self.chr_banks == 0
+
     def reset(self):
         self.control_register = 0x1C
         self.load_register = 0x00
@@ -146,6 +185,7 @@ class Mapper1(Mapper):
         self.prg_bank_select_lwrd = 0x0000
         self.prg_bank_select_hwrd = self.prg_banks - 1
         self.prg_bank_select = 0x00000000
+        self.banks_changed()
     
     def mirror_mode(self) -> int:
         return self.mirroring
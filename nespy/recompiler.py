@@ -0,0 +1,259 @@
+from nespy.instructions import *
+from nespy.addr_modes import *
+from nespy.operations import OPCODE_LOOKUP, NUL
+from nespy.fused import INSTRUCTION_SOURCE, BRANCH_CONDITIONS, PAGE_CROSS_INSTRUCTIONS
+from nespy.const import *
+
+# Basic block recompiler
+
+# straight line runs of 6502 code in PRG ROM get translated into python source, compiled once and cached per pc
+# for every PRG bank configuration the mapper can be in
+# a block charges cycles as it goes, so a register access in the middle of one still catches the ppu up to the
+# end of the instruction doing it, just like Cmp6502.step
+# code outside of PRG ROM (RAM, PRG RAM) can modify itself so it is always left to the interpreter
+# interrupts are only looked at between steps, so a block knows the most cycles it can take and the cpu only runs it
+# when it ends before the ppu could raise one, a block also stops after a register access that raised an nmi or
+# finished the frame, either way both get noticed on the same instruction the interpreter would notice them on
+
+BLOCK_MAX_INSTRUCTIONS = 32
+
+OPERAND_BYTES = {IMP: 0, NUL: 0, IMM: 1, ZP0: 1, ZPX: 1, ZPY: 1, REL: 1, IZX: 1, IZY: 1, ABS: 2, ABX: 2, ABY: 2, IND: 2}
+
+# addressing modes where the effective address is only known at runtime
+DYNAMIC_ADDR_MODES = (ABX, ABY, IND, IZX, IZY)
+
+# instructions that leave the block, everything after them could be anywhere
+BLOCK_END_INSTRUCTIONS = (JMP, JSR, RTS, RTI, BRK) + tuple(BRANCH_CONDITIONS)
+
+def addr_lines(addr_mode, operand: int) -> list:
+    # same as the fused addressing modes but with the operand baked in, leaves the address in addr
+    if addr_mode in (ZP0, ABS):
+        return [f"addr = 0x{operand:04X}"]
+    if addr_mode is ZPX:
+        return [f"addr = (0x{operand:02X} + cpu.x) & 0xFF"]
+    if addr_mode is ZPY:
+        return [f"addr = (0x{operand:02X} + cpu.y) & 0xFF"]
+    if addr_mode is ABX:
+        return [f"addr = (0x{operand:04X} + cpu.x) & 0xFFFF"]
+    if addr_mode is ABY:
+        return [f"addr = (0x{operand:04X} + cpu.y) & 0xFFFF"]
+    if addr_mode is IND:
+        if operand & 0xFF == 0xFF:
+            return [f"addr = (read(0x{operand & 0xFF00:04X}) << 8) | read(0x{operand:04X})"]
+        return [f"addr = (read(0x{operand + 1:04X}) << 8) | read(0x{operand:04X})"]
+    if addr_mode is IZX:
+        return [
+            f"lo = read((0x{operand:02X} + cpu.x) & 0xFF)",
+            f"hi = read((0x{operand:02X} + cpu.x + 1) & 0xFF)",
+            f"addr = (hi << 8) | lo",
+        ]
+    if addr_mode is IZY:
+        return [
+            f"lo = read(0x{operand:02X})",
+            f"hi = read(0x{(operand + 1) & 0xFF:02X}) << 8",
+            f"addr = ((hi | lo) + cpu.y) & 0xFFFF",
+        ]
+
+    return []
+
+def block_source(code_read, pc: int) -> str:
+    """
+    Translate the basic block starting at pc into the source of a function taking the cpu,
+    code_read(addr) gives back the byte at addr or None if it isn't PRG ROM, returns None if nothing could be translated,
+    the function gets the most cycles it can take as block.cycles
+    """
+    lines = []
+    pending = 0 # cycles not charged to the cpu yet
+    most = 0 # cycles the block takes if every branch is taken and every page crossed
+    count = 0
+    ended = False
+
+    while count < BLOCK_MAX_INSTRUCTIONS:
+        opcode = code_read(pc)
+        if opcode is None:
+            break
+
+        instruction, addr_mode, cycles = OPCODE_LOOKUP[opcode]
+        if instruction is NUL and addr_mode is NUL:
+            break # undocumented opcode, leave it to the interpreter
+
+        size = OPERAND_BYTES[addr_mode]
+        next_pc = pc + 1 + size
+        if next_pc > 0x10000:
+            break
+
+        operand_bytes = [code_read(pc + 1 + i) for i in range(size)]
+        if None in operand_bytes:
+            break
+
+        operand = operand_bytes[0] | (operand_bytes[1] << 8) if size == 2 else (operand_bytes[0] if size else 0)
+        next_pc &= 0xFFFF
+
+        lines.append(f"# ${pc:04X} {instruction.__name__} {addr_mode.__name__}")
+        count += 1
+        most += cycles
+
+        if instruction in BRANCH_CONDITIONS:
+            target = (next_pc + (operand - 0x100 if operand & 0x80 else operand)) & 0xFFFF
+            taken = pending + cycles + 1 + ((target & 0xFF00) != (next_pc & 0xFF00))
+            most += taken - pending - cycles
+            lines += [
+                f"if {BRANCH_CONDITIONS[instruction]}:",
+                f"    cpu.pc = 0x{target:04X}",
+                f"    cpu.clock_count += {taken}",
+                f"    return",
+                f"cpu.pc = 0x{next_pc:04X}",
+                f"cpu.clock_count += {pending + cycles}",
+            ]
+            ended = True
+            break
+
+        body = INSTRUCTION_SOURCE[instruction].strip()
+        touches = "{fetch}" in body or "{store}" in body or "write(addr" in body
+        writes = "{store}" in body or "write(addr" in body
+
+        if addr_mode is IMP:
+            fetch, store = "cpu.a", "cpu.a = t"
+        elif addr_mode is IMM:
+            fetch, store = f"0x{operand:02X}", ""
+        else:
+            fetch, store = "read(addr)", "write(addr, t)"
+
+        dynamic = addr_mode in DYNAMIC_ADDR_MODES
+        static_io = addr_mode is ABS and 0x2000 <= operand <= 0x401F
+        cartridge_write = writes and (dynamic or (addr_mode is ABS and operand >= 0x4020))
+
+        lines += addr_lines(addr_mode, operand)
+
+        if instruction in BLOCK_END_INSTRUCTIONS:
+            if instruction is JMP:
+                lines.append("cpu.pc = addr")
+            else:
+                lines.append(f"cpu.pc = 0x{next_pc:04X}")
+                lines += body.format(fetch=fetch, store=store).splitlines()
+
+            lines.append(f"cpu.clock_count += {pending + cycles}")
+            ended = True
+            break
+
+        # charge everything up to the end of this instruction before it can touch a register or the mapper
+        if touches and (dynamic or static_io or cartridge_write):
+            lines.append(f"cpu.clock_count += {pending + cycles}")
+            pending = 0
+
+            if writes and (dynamic or operand == 0x4014): # an OAM DMA times its start from the instruction's
+                lines.append(f"cpu.instruction_clock = cpu.clock_count - {cycles}")
+        else:
+            pending += cycles
+
+        lines += body.format(fetch=fetch, store=store).splitlines()
+
+        if addr_mode in (ABX, ABY, IZY) and (instruction in PAGE_CROSS_INSTRUCTIONS or (instruction is NOP and addr_mode is ABX)):
+            hi = "hi" if addr_mode is IZY else f"0x{operand & 0xFF00:04X}"
+            lines.append(f"cpu.clock_count += (addr & 0xFF00) != {hi}")
+            most += 1
+
+        if cartridge_write:
+            # a mapper write can switch the bank we are running from, stop here and look up the next block again
+            lines += [
+                f"if mapper.bank_epoch != epoch:",
+                f"    cpu.pc = 0x{next_pc:04X}",
+                f"    return",
+            ]
+
+        if touches and (dynamic or (static_io and operand <= 0x3FFF)):
+            # catching the ppu up can finish the frame and a PPUCTRL write during vblank raises an nmi straight away,
+            # the interpreter would notice either before the next instruction
+            lines += [
+                f"if ppu.nmi or ppu.frame_complete:",
+                f"    cpu.pc = 0x{next_pc:04X}",
+                f"    return",
+            ]
+
+        pc = next_pc
+
+        if addr_mode is ABS and operand == 0x4014 and writes:
+            break # the cpu has to sit out the DMA before anything else runs
+
+    if not count:
+        return None
+
+    if not ended:
+        lines += [f"cpu.pc = 0x{pc:04X}", f"cpu.clock_count += {pending}"]
+
+    source = ["def block(cpu):", "    read = cpu.bus.read", "    write = cpu.bus.write"]
+
+    if "epoch" in "\n".join(lines):
+        source += ["    mapper = cpu.bus.cartridge.mapper", "    epoch = mapper.bank_epoch"]
+
+    if "ppu.nmi" in "\n".join(lines):
+        source += ["    ppu = cpu.bus.ppu"]
+
+    source += ["    " + line for line in lines]
+    source += [f"block.cycles = {most}"]
+
+    return "\n".join(source)
+
+class Recompiler():
+    bus = None
+    mapper = None
+
+    bank_epoch: int = -1
+
+    cache: dict = None # bank configuration -> {pc: block}
+    blocks: dict = None # blocks for the current bank configuration
+
+    namespace: dict = None
+
+    compiled: int = 0 # blocks compiled so far, for debugging
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.namespace = {"C": C, "Z": Z, "I": I, "D": D, "B": B, "U": U, "V": V, "N": N, "NZ_FLAGS": NZ_FLAGS}
+        self.flush()
+
+    def flush(self):
+        self.cache = {}
+        self.blocks = None
+        self.mapper = None
+        self.bank_epoch = -1
+
+    def code_read(self, addr: int) -> int:
+        # only PRG ROM is safe to compile, anything the cartridge backs with RAM reports None
+        if addr < 0x8000 or addr > 0xFFFF:
+            return None
+
+        return self.bus.cartridge.cpu_read(addr)
+
+    def block(self, pc: int):
+        """
+        Get the compiled block starting at pc, None means the interpreter has to run it
+        """
+        mapper = self.bus.cartridge.mapper
+
+        if mapper is not self.mapper:
+            self.flush()
+            self.mapper = mapper
+
+        if mapper.bank_epoch != self.bank_epoch:
+            self.bank_epoch = mapper.bank_epoch
+            self.blocks = self.cache.setdefault(mapper.prg_bank_key(), {})
+
+        try:
+            return self.blocks[pc]
+        except KeyError:
+            pass
+
+        block = None
+
+        if pc >= 0x8000:
+            source = block_source(self.code_read, pc)
+
+            if source is not None:
+                exec(compile(source, f"<nespy block ${pc:04X}>", "exec"), self.namespace)
+                block = self.namespace.pop("block")
+                self.compiled += 1
+
+        self.blocks[pc] = block
+
+        return block
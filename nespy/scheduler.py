@@ -0,0 +1,64 @@
+import heapq
+
+# Event scheduler
+
+# instead of checking every component on every system clock the per-dot engine keeps a timeline of the clocks
+# something is going to happen on, the cpu's next cycle, the apu's next frame sequencer step or an interrupt the
+# ppu just raised, and only compares the clock against the earliest one
+# handlers run in clock order, events on the same clock in the order they were scheduled, and schedule
+# whatever comes next themselves
+# the cpu comes around far too often to go through the heap, it gets a fixed period lane of its own that runs
+# before anything else due on the same clock
+
+class Scheduler():
+    events: list = None # heap of (clock, order, handler)
+    next_clock: int = 0 # clock of the earliest event
+    order: int = 0 # how many events have been scheduled, breaks ties between events on the same clock
+
+    tick_clock: int = 0 # clock the periodic handler runs on next
+    tick_period: int = 0
+    tick_handler = None
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.events = []
+        self.next_clock = 0xFFFFFFFFFFFFFFFF
+        self.order = 0
+        self.tick_clock = 0xFFFFFFFFFFFFFFFF
+        self.tick_handler = None
+
+    def repeat(self, clock: int, period: int, handler):
+        """
+        Call handler() on clock and every period clocks after that, replaces the last handler repeat was given
+        """
+        self.tick_clock = clock
+        self.tick_period = period
+        self.tick_handler = handler
+        self.next_clock = min(self.next_clock, clock)
+
+    def schedule(self, clock: int, handler):
+        """
+        Call handler() once the system clock gets to clock
+        """
+        heapq.heappush(self.events, (clock, self.order, handler))
+        self.order += 1
+
+        if clock < self.next_clock:
+            self.next_clock = clock
+
+    def run(self, clock: int):
+        """
+        Call every handler due by clock, including the ones they schedule for it
+        """
+        events = self.events
+
+        while self.tick_clock <= clock:
+            self.tick_clock += self.tick_period
+            self.tick_handler()
+
+        while events and events[0][0] <= clock:
+            heapq.heappop(events)[2]()
+
+        self.next_clock = min(self.tick_clock, events[0][0]) if events else self.tick_clock
@@ -0,0 +1,41 @@
+import numpy as np
+
+# Decoded CHR tiles
+
+# every 16 bytes of CHR memory are one 8x8 tile, a bit plane of 8 rows for the low bit of each pixel followed by one
+# for the high bit, decoding them once up front turns a row of a tile into a single lookup for the renderers
+# CHR RAM writes only mark their tile, it is decoded again the next time the tiles are needed
+
+class TileCache():
+    memory: bytearray = None # the CHR memory the tiles are decoded from
+
+    tiles: np.ndarray = None # (tile, row, column) -> 2 bit pixel
+    dirty: set = None # tiles written to since they were last decoded
+
+    def __init__(self, memory: bytearray):
+        self.memory = memory
+        self.tiles = np.zeros((len(memory) // 16, 8, 8), dtype=np.uint8)
+        self.dirty = set()
+        self.decode(range(len(self.tiles)))
+
+    def decode(self, tiles):
+        planes = np.frombuffer(self.memory, dtype=np.uint8).reshape(-1, 2, 8, 1)[tiles]
+        self.tiles[tiles] = np.unpackbits(planes[:, 0], axis=2) | (np.unpackbits(planes[:, 1], axis=2) << 1)
+
+    def invalidate(self, addr: int):
+        self.dirty.add(addr >> 4)
+
+    def update(self):
+        # bring the tiles written to since the last update up to date, the arrays handed out stay the same
+        if self.dirty:
+            self.decode(sorted(self.dirty))
+            self.dirty.clear()
+
+    def table(self, addr: int) -> np.ndarray:
+        """
+        Get the 256 tiles of a pattern table starting at addr in CHR memory, None if it doesn't line up with a tile
+        """
+        if addr & 0x0F or addr + 0x1000 > len(self.memory):
+            return None
+
+        return self.tiles[addr >> 4:(addr >> 4) + 256]